@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from termcolor import colored
+
+import bgpm
+from check_solution import get_cache_files
+
+err_bullet = colored(">>>", "red")
+inf_bullet = colored(">>>", "green")
+
+RRC04 = "rrc04"
+RRC12 = "rrc12"
+
+# task name -> (task function, input directory, kind of file)
+TASKS = {
+    "task_1a": (bgpm.unique_prefixes_by_snapshot, "rib_files", bgpm.RIB_FILE),
+    "task_1b": (bgpm.unique_ases_by_snapshot, "rib_files", bgpm.RIB_FILE),
+    "task_1c": (bgpm.top_10_ases_by_prefix_growth, "rib_files", bgpm.RIB_FILE),
+    "task_2": (bgpm.shortest_path_by_origin_by_snapshot, "rib_files", bgpm.RIB_FILE),
+    "task_3": (bgpm.aw_event_durations, "update_files", bgpm.UPD_FILE),
+    "task_4": (bgpm.rtbh_event_durations, "update_files_blackholing", bgpm.UPD_FILE),
+}
+
+# tasks with an approximate (HyperLogLog) mode, benchmarked as "<task>_hll" with --approximate
+APPROXIMATE_TASKS = ["task_1a", "task_1b"]
+
+# tasks whose community check is benchmarked, as "<task>_communities" with --communities
+COMMUNITY_TASKS = ["task_4"]
+
+# metrics compared against the baseline - for all of them, higher values are worse
+REGRESSION_METRICS = ["median_seconds", "p95_seconds", "peak_memory_bytes"]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def count_input(cache_files, data_type, element_cache, backend):
+    """Count the records, elements and bytes of the input files (untimed)."""
+    records = elements = 0
+    for fpath in cache_files:
+        for _, elems in bgpm.open_records(fpath, data_type, element_cache, backend):
+            records += 1
+            elements += len(elems)
+    return records, elements, sum(os.path.getsize(fpath) for fpath in cache_files)
+
+
+def _peak_rss():
+    # Linux carries the ru_maxrss of the process that called exec over to the new program, so the spawned child would
+    # report the parent's peak - VmHWM belongs to the child's own address space
+    if sys.platform.startswith("linux"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _peak_rss_child(func, cache_files, options, conn):
+    func(cache_files, **options)
+    conn.send(_peak_rss())
+    conn.close()
+
+
+def measure_memory(func, cache_files, options, method):
+    """
+    Return the peak memory in bytes of one run of func.
+
+    tracemalloc measures the peak of the Python allocations of the run, rss measures the peak resident set size of a
+    freshly spawned interpreter that runs only this task. A forked child would start out with, and report, the
+    memory of this process.
+    """
+    if method == "tracemalloc":
+        tracemalloc.start()
+        try:
+            func(cache_files, **options)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe(duplex=False)
+    proc = context.Process(target=_peak_rss_child, args=(func, cache_files, options, child))
+    proc.start()
+    # drop our copy of the sending end so that recv() fails instead of blocking if the child dies
+    child.close()
+    peak = parent.recv()
+    proc.join()
+    return peak
+
+
+def benchmark_task(func, cache_files, data_type, options, warmup, repetitions, memory):
+    """Run one task warmup + repetitions times and summarise its latency, throughput and peak memory."""
+    for _ in range(warmup):
+        func(cache_files, **options)
+
+    latencies = []
+    for _ in range(repetitions):
+        begin = time.perf_counter()
+        func(cache_files, **options)
+        latencies.append(time.perf_counter() - begin)
+
+    records, elements, nbytes = count_input(cache_files, data_type, options.get("element_cache"),
+                                           options.get("backend", bgpm.PYBGPSTREAM))
+    median = statistics.median(latencies)
+    return {
+        "files": len(cache_files),
+        "records": records,
+        "elements": elements,
+        "bytes": nbytes,
+        "repetitions": repetitions,
+        "median_seconds": median,
+        "p95_seconds": percentile(latencies, 95),
+        "records_per_second": records / median if median else 0.0,
+        "elements_per_second": elements / median if median else 0.0,
+        "mb_per_second": nbytes / 1e6 / median if median else 0.0,
+        "peak_memory_bytes": measure_memory(func, cache_files, options, memory),
+        "memory_method": memory,
+    }
+
+
+def relative_errors(exact, approximate):
+    """Mean and maximum relative error of approximate per-snapshot counts."""
+    errors = [abs(estimate - count) / count if count else float(estimate != 0)
+              for count, estimate in zip(exact, approximate)]
+    return statistics.mean(errors), max(errors)
+
+
+def collect_communities(cache_files, data_type, element_cache, backend):
+    """Return the communities of every announcement of the input files (untimed)."""
+    return [elem[bgpm.ELEM_COMMUNITIES]
+            for fpath in cache_files
+            for _, elems in bgpm.open_records(fpath, data_type, element_cache, backend)
+            for elem in elems if elem[bgpm.ELEM_TYPE] == 'A']
+
+
+def string_check(communities):
+    # the suffix scan Task 4 used before bgpm.CommunityMatcher
+    return any(c.endswith(':666') for c in communities or ())
+
+
+def benchmark_communities(cache_files, data_type, options, warmup, repetitions, patterns):
+    """
+    Time bgpm.CommunityMatcher against string_check() on the communities of every announcement of the input files.
+    The median and p95 are those of the matcher, so they are compared against the baseline like a task's.
+    """
+    announcements = collect_communities(cache_files, data_type, options.get("element_cache"),
+                                        options.get("backend", bgpm.PYBGPSTREAM))
+
+    def timed(check):
+        for _ in range(warmup):
+            sum(map(check, announcements))
+        latencies = []
+        for _ in range(repetitions):
+            begin = time.perf_counter()
+            matches = sum(map(check, announcements))
+            latencies.append(time.perf_counter() - begin)
+        return latencies, matches
+
+    string_latencies, string_matches = timed(string_check)
+    latencies, matches = timed(bgpm.CommunityMatcher(patterns))
+    median, string_median = statistics.median(latencies), statistics.median(string_latencies)
+    return {
+        "elements": len(announcements),
+        "repetitions": repetitions,
+        "patterns": sorted(patterns),
+        "median_seconds": median,
+        "p95_seconds": percentile(latencies, 95),
+        "string_median_seconds": string_median,
+        "speedup": string_median / median if median else 0.0,
+        "matches": matches,
+        "string_matches": string_matches,
+    }
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """
+    Return a list of (collector, task, metric, baseline value, current value) for every metric that got worse by
+    more than threshold (a fraction, e.g. 0.1 for 10%).
+    """
+    regressions = []
+    for collector, tasks in results.items():
+        for task, current in tasks.items():
+            previous = baseline.get(collector, {}).get(task)
+            if previous is None:
+                continue
+            for metric in REGRESSION_METRICS:
+                if metric not in previous:
+                    continue
+                if metric == "peak_memory_bytes" and previous.get("memory_method") != current["memory_method"]:
+                    # tracemalloc and RSS peaks are not comparable
+                    continue
+                if current[metric] > previous[metric] * (1 + threshold):
+                    regressions.append((collector, task, metric, previous[metric], current[metric]))
+    return regressions
+
+
+def print_result(collector, task, res):
+    task_id = f"{collector}[{task:<7}]"
+    print(f"{inf_bullet} {task_id} median {res['median_seconds']:.3f}s  p95 {res['p95_seconds']:.3f}s  "
+          f"{res['elements_per_second']:,.0f} elem/s  {res['records_per_second']:,.0f} rec/s  "
+          f"{res['mb_per_second']:.2f} MB/s  peak {res['peak_memory_bytes'] / 2**20:.1f} MiB")
+    if "max_relative_error" in res:
+        print(f"{inf_bullet} {task_id} relative error mean {res['mean_relative_error']:.3%}  "
+              f"max {res['max_relative_error']:.3%} against the exact counts")
+
+
+def print_communities(collector, task, res):
+    task_id = f"{collector}[{task:<7}]"
+    print(f"{inf_bullet} {task_id} matcher median {res['median_seconds']:.3f}s  string check median "
+          f"{res['string_median_seconds']:.3f}s  speedup {res['speedup']:.2f}x over {res['elements']:,} "
+          f"announcements  {res['matches']:,} matched ({res['string_matches']:,} by the string check)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the bgpm.py tasks over the collector data sets")
+    parser.add_argument("--collectors", nargs="+", default=[RRC04, RRC12])
+    parser.add_argument("--tasks", nargs="+", choices=sorted(TASKS), default=sorted(TASKS))
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before measuring")
+    parser.add_argument("--repetitions", type=int, default=5, help="timed runs per task")
+    parser.add_argument("--memory", choices=["tracemalloc", "rss"], default="tracemalloc",
+                        help="how peak memory is measured")
+    parser.add_argument("--element-cache", help="element cache directory passed to the tasks")
+    parser.add_argument("--backend", choices=[bgpm.PYBGPSTREAM, bgpm.NATIVE], default=bgpm.PYBGPSTREAM,
+                        help="MRT decoder used by the tasks")
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes for the snapshot tasks")
+    parser.add_argument("--prefetch", type=int, default=0,
+                        help="files decoded ahead of the analyses on background threads (with --jobs 1)")
+    parser.add_argument("--queue-depth", type=int, default=bgpm.PREFETCH_QUEUE_DEPTH,
+                        help="record batches a prefetched file may get ahead of the analyses")
+    parser.add_argument("--approximate", action="store_true",
+                        help="also benchmark the HyperLogLog mode of tasks 1A and 1B and its error")
+    parser.add_argument("--precision", type=int, default=bgpm.HLL_PRECISION, help="HyperLogLog precision")
+    parser.add_argument("--communities", nargs="*", metavar="PATTERN",
+                        help="also benchmark the community matcher of task 4 against the ':666' string check, "
+                             f"with these patterns (default {' '.join(bgpm.RTBH_COMMUNITIES)})")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--save-baseline", metavar="PATH", help="save the results as the new baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="fail if a task regressed against this baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed relative slowdown or memory growth before a task counts as regressed")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    BASE_DIR = Path(os.path.abspath(__file__)).parent
+    if BASE_DIR != Path(os.getcwd()):
+        os.chdir(BASE_DIR)
+
+    results = {}
+    for collector in args.collectors:
+        msg = colored(f"Benchmarking {collector}", attrs=["bold"])
+        print(f"\n{msg}")
+        results[collector] = {}
+        for task in args.tasks:
+            func, kind, data_type = TASKS[task]
+            cache_files = get_cache_files(collector, kind)
+            if not cache_files:
+                print(f"{err_bullet} {collector}[{task:<7}] no input files in {Path(collector, kind)} - skipped")
+                continue
+
+            options = {"element_cache": args.element_cache, "backend": args.backend, "prefetch": args.prefetch,
+                       "queue_depth": args.queue_depth}
+            if data_type == bgpm.RIB_FILE:
+                options["jobs"] = args.jobs
+            res = benchmark_task(func, cache_files, data_type, options, args.warmup, args.repetitions, args.memory)
+            results[collector][task] = res
+            print_result(collector, task, res)
+
+            if args.approximate and task in APPROXIMATE_TASKS:
+                approximate = partial(func, approximate=True, precision=args.precision)
+                res = benchmark_task(approximate, cache_files, data_type, options, args.warmup, args.repetitions,
+                                     args.memory)
+                res["precision"] = args.precision
+                res["mean_relative_error"], res["max_relative_error"] = relative_errors(
+                    func(cache_files, **options), approximate(cache_files, **options))
+                results[collector][f"{task}_hll"] = res
+                print_result(collector, f"{task}_hll", res)
+
+            if args.communities is not None and task in COMMUNITY_TASKS:
+                patterns = args.communities or bgpm.RTBH_COMMUNITIES
+                res = benchmark_communities(cache_files, data_type, options, args.warmup, args.repetitions, patterns)
+                results[collector][f"{task}_communities"] = res
+                print_communities(collector, f"{task}_communities", res)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+            f.write("\n")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=4)
+            f.write("\n")
+        print(f"\n{inf_bullet} baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{err_bullet} {len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for collector, task, metric, previous, current in regressions:
+                print(f"{err_bullet} {collector}[{task:<7}] {metric}: {previous:.4g} -> {current:.4g}")
+            sys.exit(1)
+        print(f"\n{inf_bullet} no regressions over {args.threshold:.0%} against {args.baseline}")
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from termcolor import colored
+
+import bgpm
+from check_solution import get_cache_files
+
+err_bullet = colored(">>>", "red")
+inf_bullet = colored(">>>", "green")
+
+RRC04 = "rrc04"
+RRC12 = "rrc12"
+
+
+# The per-snapshot loops of the original task functions, on element tuples instead of pybgpstream elements. They are
+# the reference the analyses are timed against.
+def baseline_1a(files):
+    counts = []
+    for elems in files:
+        unique_prefixes = set()
+        for elem in elems:
+            if elem[bgpm.ELEM_PREFIX] is not None:
+                unique_prefixes.add(elem[bgpm.ELEM_PREFIX])
+        counts.append(len(unique_prefixes))
+    return counts
+
+
+def baseline_1b(files):
+    counts = []
+    for elems in files:
+        unique_ases = set()
+        for elem in elems:
+            if elem[bgpm.ELEM_AS_PATH] is not None:
+                for part in elem[bgpm.ELEM_AS_PATH].split():
+                    unique_ases.add(part)
+        counts.append(len(unique_ases))
+    return counts
+
+
+def baseline_1c(files):
+    snapshots = []
+    for elems in files:
+        prefixes = {}
+        for elem in elems:
+            if elem[bgpm.ELEM_AS_PATH] and elem[bgpm.ELEM_PREFIX] is not None:
+                origin = elem[bgpm.ELEM_AS_PATH].split()[-1]
+                if origin not in prefixes:
+                    prefixes[origin] = set()
+                prefixes[origin].add(elem[bgpm.ELEM_PREFIX])
+        snapshots.append({origin: len(origin_prefixes) for origin, origin_prefixes in prefixes.items()})
+    return snapshots
+
+
+def baseline_2(files):
+    snapshots = []
+    for elems in files:
+        min_paths = {}
+        for elem in elems:
+            if elem[bgpm.ELEM_AS_PATH]:
+                as_path = elem[bgpm.ELEM_AS_PATH].split()
+                length = len(set(as_path))
+                if length > 1 and (as_path[-1] not in min_paths or length < min_paths[as_path[-1]]):
+                    min_paths[as_path[-1]] = length
+        snapshots.append(min_paths)
+    return snapshots
+
+
+def run_analysis(factory, files):
+    analysis = factory()
+    for ndx, elems in enumerate(files):
+        analysis.begin_file(ndx, None)
+        for elem in elems:
+            analysis.consume(elem)
+        analysis.end_file(ndx, None)
+    return analysis.result()
+
+
+# task name -> (baseline loop, analysis factory)
+TASKS = {
+    "task_1a": (baseline_1a, bgpm.UniquePrefixes),
+    "task_1b": (baseline_1b, bgpm.UniqueASes),
+    "task_1c": (baseline_1c, bgpm.PrefixGrowth),
+    "task_2": (baseline_2, bgpm.ShortestPaths),
+}
+
+
+class FullTable:
+    """
+    A synthetic full-table RIB snapshot of prefixes prefixes, each seen by peers peers, as element tuples that are
+    built while it is iterated. Like decoded elements, every element has its own AS path string and the elements of a
+    prefix share its prefix string, so a set that keeps them keeps the strings alive.
+    """
+
+    def __init__(self, prefixes, peers, seed=0):
+        rng = random.Random(seed)
+        self.prefixes = prefixes
+        self.peers = [(f"192.0.2.{peer + 1}", str(64496 + peer)) for peer in range(peers)]
+        # the paths behind the peers: a few transit ASes, more regional ones and about 75k origins like in the
+        # real table, which fix the origin of every prefix
+        tiers = [[str(rng.randrange(1, 400000)) for _ in range(size)] for size in (20, 2000, 75000)]
+        self.paths = [" ".join(rng.choice(tier) for tier in tiers[rng.randint(0, 2):])
+                      for _ in range(1 << 17)]
+
+    def __len__(self):
+        return self.prefixes * len(self.peers)
+
+    def __iter__(self):
+        paths = self.paths
+        for ndx in range(self.prefixes):
+            # one in eight prefixes is IPv6, the IPv4 ones are mostly /24s
+            if ndx % 8 == 7:
+                prefix = f"2a00:{ndx >> 16:x}:{ndx & 0xFFFF:x}::/48"
+            else:
+                address = (16 << 24) + (ndx << 8)
+                prefix = f"{address >> 24}.{(address >> 16) & 255}.{(address >> 8) & 255}.0/{24 - (ndx % 5 == 0)}"
+            path = paths[ndx % len(paths)]
+            for peer_ip, peer_asn in self.peers:
+                yield "R", 0.0, peer_ip, prefix, f"{peer_asn} {path}", None
+
+
+def decode(cache_files, element_cache, backend):
+    """Decode every file into one list of elements per file (untimed)."""
+    return [[elem for _, elems in bgpm.open_records(fpath, bgpm.RIB_FILE, element_cache, backend) for elem in elems]
+            for fpath in cache_files]
+
+
+def measure(func, files, repetitions):
+    """Median seconds of func(files) over repetitions runs and the peak of its Python allocations."""
+    latencies = []
+    for _ in range(repetitions):
+        begin = time.perf_counter()
+        func(files)
+        latencies.append(time.perf_counter() - begin)
+    tracemalloc.start()
+    try:
+        func(files)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return statistics.median(latencies), peak
+
+
+def str_set_bytes(keys):
+    # a set of strings and the strings it holds
+    return sys.getsizeof(keys) + sum(sys.getsizeof(key) for key in keys)
+
+
+def packed_bytes(packed):
+    unique, overflow = packed.contents()
+    size = unique.nbytes if bgpm.np is not None else str_set_bytes(unique)
+    return size + str_set_bytes(overflow)
+
+
+def key_memory(elems):
+    """Bytes held by the Task 1A prefixes and Task 1C (origin, prefix) pairs of one snapshot as strings and packed."""
+    prefixes = {elem[bgpm.ELEM_PREFIX] for elem in elems if elem[bgpm.ELEM_PREFIX] is not None}
+    pairs = {(elem[bgpm.ELEM_AS_PATH].split()[-1], elem[bgpm.ELEM_PREFIX]) for elem in elems
+             if elem[bgpm.ELEM_AS_PATH] and elem[bgpm.ELEM_PREFIX] is not None}
+    pair_bytes = sys.getsizeof(pairs) + sum(sys.getsizeof(pair) for pair in pairs) + str_set_bytes(prefixes)
+    return {
+        "prefixes": len(prefixes),
+        "prefix_str_bytes": str_set_bytes(prefixes),
+        "prefix_packed_bytes": packed_bytes(bgpm.PackedSet(map(bgpm.pack_prefix, prefixes))),
+        "pairs": len(pairs),
+        "pair_str_bytes": pair_bytes,
+        "pair_packed_bytes": packed_bytes(bgpm.PackedPairSet((bgpm.pack_asn(origin), bgpm.pack_prefix(prefix))
+                                                             for origin, prefix in pairs)),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time the per-element work of the RIB analyses against the original "
+                                                 "set loops on pre-decoded elements, and compare the memory of the "
+                                                 "snapshot keys as strings and packed")
+    parser.add_argument("--collectors", nargs="*", default=[RRC04, RRC12])
+    parser.add_argument("--tasks", nargs="+", choices=sorted(TASKS), default=sorted(TASKS))
+    parser.add_argument("--repetitions", type=int, default=3, help="timed runs per task")
+    parser.add_argument("--element-cache", help="element cache directory used to decode the files")
+    parser.add_argument("--backend", choices=[bgpm.PYBGPSTREAM, bgpm.NATIVE], default=bgpm.PYBGPSTREAM,
+                        help="MRT decoder used to decode the files")
+    parser.add_argument("--full-table", type=int, metavar="PREFIXES",
+                        help="also run on one synthetic full-table snapshot of this many prefixes, e.g. 1000000")
+    parser.add_argument("--peers", type=int, default=8, help="peers that see every prefix of the full table")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    BASE_DIR = Path(os.path.abspath(__file__)).parent
+    if BASE_DIR != Path(os.getcwd()):
+        os.chdir(BASE_DIR)
+
+    # data set -> list of the elements of every snapshot
+    data_sets = {}
+    for collector in args.collectors:
+        cache_files = get_cache_files(collector, "rib_files")
+        if not cache_files:
+            print(f"{err_bullet} {collector} no input files in {Path(collector, 'rib_files')} - skipped")
+            continue
+        data_sets[collector] = decode(cache_files, args.element_cache, args.backend)
+    if args.full_table:
+        data_sets["full_table"] = [FullTable(args.full_table, args.peers)]
+
+    results = {}
+    for name, files in data_sets.items():
+        msg = colored(f"Benchmarking the analyses on {name}", attrs=["bold"])
+        print(f"\n{msg}")
+        results[name] = {"elements": sum(map(len, files))}
+        # the time it takes to only produce the elements, which is part of every measurement below
+        stream_seconds, _ = measure(lambda files: [sum(1 for _ in elems) for elems in files], files, 1)
+        results[name]["stream_seconds"] = stream_seconds
+        print(f"{inf_bullet} {name}[stream ] {results[name]['elements']:,} elements in {stream_seconds:.3f}s")
+
+        for task in args.tasks:
+            baseline, factory = TASKS[task]
+            base_seconds, base_peak = measure(baseline, files, args.repetitions)
+            seconds, peak = measure(lambda files: run_analysis(factory, files), files, args.repetitions)
+            results[name][task] = {"baseline_seconds": base_seconds, "baseline_peak_bytes": base_peak,
+                                   "seconds": seconds, "peak_bytes": peak}
+            print(f"{inf_bullet} {name}[{task:<7}] analysis {seconds:.3f}s peak {peak / 2**20:.1f} MiB  "
+                  f"baseline {base_seconds:.3f}s peak {base_peak / 2**20:.1f} MiB")
+
+        keys = results[name]["keys"] = key_memory(files[-1])
+        print(f"{inf_bullet} {name}[keys   ] last snapshot: {keys['prefixes']:,} prefixes "
+              f"{keys['prefix_str_bytes'] / 2**20:.1f} MiB as strings, {keys['prefix_packed_bytes'] / 2**20:.1f} MiB "
+              f"packed; {keys['pairs']:,} (origin, prefix) pairs {keys['pair_str_bytes'] / 2**20:.1f} MiB as "
+              f"strings, {keys['pair_packed_bytes'] / 2**20:.1f} MiB packed")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+            f.write("\n")
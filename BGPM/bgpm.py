@@ -1,7 +1,41 @@
 #!/usr/bin/env python3
 
-import pybgpstream
+import bisect
+import bz2
+import gzip
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import pickle
+import queue
+import socket
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import warnings
+import weakref
+from array import array
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import islice, repeat
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pybgpstream
+except ImportError:
+    pybgpstream = None
 """
 CS 6250 BGP Measurements Project
 
@@ -11,87 +45,3135 @@ Notes:
 - You may add additional functions but they must be contained entirely in this file
 """
 
+RIB_FILE = "rib-file"
+UPD_FILE = "upd-file"
+
+# Every analysis consumes decoded elements as plain tuples with this layout:
+#   (type, timestamp, peer_address, prefix, as_path, communities)
+# Fields that are not present in the decoded element are None.
+ELEM_TYPE, ELEM_TIME, ELEM_PEER, ELEM_PREFIX, ELEM_AS_PATH, ELEM_COMMUNITIES = range(6)
+ALL_FIELDS = frozenset((ELEM_PREFIX, ELEM_AS_PATH, ELEM_COMMUNITIES))
+
+# MRT decoders: pybgpstream's singlefile interface, or the pure Python reader below
+PYBGPSTREAM = "pybgpstream"
+NATIVE = "native"
+
+# reasons returned by Analysis.consume() for elements that don't contribute to the analysis
+SKIP_NO_PREFIX = "no prefix"
+SKIP_NO_AS_PATH = "no as-path"
+SKIP_SINGLE_AS = "single-AS path"
+SKIP_OTHER_TYPE = "other element type"
+SKIP_OUTSIDE_WINDOW = "older than the window"
+
+# element types -> the libbgpstream elemtype filter values
+FILTER_ELEM_TYPES = {'R': "ribs", 'A': "announcements", 'W': "withdrawals", 'S': "peerstates"}
+# prefix lists longer than this are checked in Python instead of being compiled into the filter string
+MAX_FILTER_PREFIXES = 1 << 14
+
+
+# community patterns Task 4 counts as blackholing: value 666 under any ASN, which covers both the RFC 7999 BLACKHOLE
+# community 65535:666 and the ASN:666 tags of the providers that predate it
+RTBH_COMMUNITIES = ("*:666",)
+# CommunityMatcher forgets the community strings it has seen once it remembers this many
+MAX_MATCHED_COMMUNITIES = 1 << 16
+
+
+def parse_community(community):
+    """
+    Return the integer parts of a standard 'asn:value' (RFC 1997) or large 'global:local1:local2' (RFC 8092)
+    community string, or None if it is neither.
+    """
+    parts = community.split(":")
+    if len(parts) not in (2, 3):
+        return None
+    try:
+        return tuple(int(part) for part in parts)
+    except ValueError:
+        return None
+
+
+class CommunityMatcher:
+    """
+    Compiled set of community patterns.
+
+    A pattern is a standard community 'asn:value' or a large community 'global:local1:local2' in which any part may
+    be '*', e.g. '65535:666', '*:666', '64500:*' or '64500:*:666'. Standard patterns only match standard communities
+    and large patterns only large ones.
+
+    The patterns are grouped by their size and the positions of their fixed parts, and every group keeps the set of
+    its fixed parts, so a parsed community is checked with one hash lookup per group. Elements repeat the same few
+    community strings, so the result is remembered per string: a community is only parsed the first time it is seen.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = frozenset(patterns)
+        groups = defaultdict(set)  # key: (size, positions of the fixed parts), value: set of the fixed parts
+        for pattern in self.patterns:
+            parts = pattern.split(":")
+            fixed = tuple(i for i, part in enumerate(parts) if part != "*")
+            if len(parts) not in (2, 3) or not all(parts[i].isdigit() for i in fixed):
+                raise ValueError(f"invalid community pattern {pattern!r}")
+            groups[len(parts), fixed].add(tuple(int(parts[i]) for i in fixed))
+        self.groups = {2: [], 3: []}  # key: size, value: list of (positions of the fixed parts, fixed parts)
+        for (size, fixed), values in groups.items():
+            self.groups[size].append((fixed, values))
+        self.matched = {}  # key: community string, value: whether it matches
+
+    def __reduce__(self):
+        # analyses holding a matcher are pickled into checkpoints and worker processes, without the remembered strings
+        return CommunityMatcher, (sorted(self.patterns),)
+
+    def match(self, community):
+        """Tell whether one community string matches any of the patterns."""
+        parts = parse_community(community)
+        if parts is None:
+            return False
+        for fixed, values in self.groups[len(parts)]:
+            if tuple(parts[i] for i in fixed) in values:
+                return True
+        return False
+
+    def __call__(self, communities):
+        """Tell whether any of the community strings, e.g. ELEM_COMMUNITIES of an element, matches a pattern."""
+        matched = self.matched
+        for community in communities or ():
+            result = matched.get(community)
+            if result is None:
+                if len(matched) >= MAX_MATCHED_COMMUNITIES:
+                    matched.clear()
+                result = matched[community] = self.match(community)
+            if result:
+                return True
+        return False
+
+    def is_standard(self):
+        """Tell whether all patterns are standard communities, the only ones libbgpstream filters on."""
+        return not self.groups[3]
+
+
+class ElementFilter:
+    """
+    Declarative description of the elements an analysis needs.
+
+    Every constraint that is not None must hold for an element to match:
+        types: Element types, e.g. ('A', 'W')
+        communities: Community patterns, see CommunityMatcher, e.g. ('*:666',) - at least one community of the
+            element has to match one of them
+        peers: Peer addresses
+        prefixes: Prefixes, matched exactly
+        pairs: (peer address, prefix) pairs
+
+    compile() turns the constraints libbgpstream can express into a BGPStream filter string; open_records() applies
+    the rest in Python. Filters only drop elements the analysis would ignore anyway, so applying the union of the
+    filters of several analyses is always safe.
+    """
+
+    def __init__(self, types=None, communities=None, peers=None, prefixes=None, pairs=None):
+        self.types = None if types is None else frozenset(types)
+        self.communities = None if communities is None else frozenset(communities)
+        self.peers = None if peers is None else frozenset(peers)
+        self.prefixes = None if prefixes is None else frozenset(prefixes)
+        self.pairs = None if pairs is None else frozenset(pairs)
+
+    def _constraints(self):
+        return self.types, self.communities, self.peers, self.prefixes, self.pairs
+
+    def __eq__(self, other):
+        return isinstance(other, ElementFilter) and self._constraints() == other._constraints()
+
+    def __hash__(self):
+        return hash(self._constraints())
+
+    def matches_nothing(self):
+        return any(constraint is not None and not constraint for constraint in self._constraints())
+
+    def union(self, other):
+        """Return a filter that matches every element either filter matches (and possibly more)."""
+        def either(mine, theirs):
+            return None if mine is None or theirs is None else mine | theirs
+
+        return ElementFilter(*(either(mine, theirs) for mine, theirs in zip(self._constraints(),
+                                                                            other._constraints())))
+
+    def compile(self):
+        """
+        Return (filter string, exact), where exact tells whether the filter string expresses the whole filter. The
+        filter string is empty if no constraint can be expressed.
+
+        libbgpstream ORs the values of repeated terms of the same kind, so every value gets its own term. Peers are
+        filtered by ASN in libbgpstream, not by address, so they are never compiled.
+        """
+        terms = []
+        exact = self.peers is None
+        if self.types is not None:
+            terms += [f"elemtype {FILTER_ELEM_TYPES[elem_type]}" for elem_type in sorted(self.types)]
+        if self.communities is not None:
+            if CommunityMatcher(self.communities).is_standard():
+                terms += [f"community {pattern}" for pattern in sorted(self.communities)]
+            else:
+                # the terms are ORed, so leaving out the large patterns would drop the elements only they match
+                exact = False
+
+        prefixes = self.prefixes
+        if self.pairs is not None:
+            exact = False
+            if prefixes is None:
+                # the prefixes of the pairs are a superset that libbgpstream can check
+                prefixes = {prefix for _, prefix in self.pairs}
+        if prefixes is not None:
+            if len(prefixes) <= MAX_FILTER_PREFIXES:
+                terms += [f"prefix exact {prefix}" for prefix in sorted(prefixes)]
+            else:
+                exact = False
+        return " and ".join(terms), exact
+
+    def predicate(self):
+        """Return a function that tells whether an element tuple matches the filter."""
+        checks = []
+        if self.types is not None:
+            types = self.types
+            checks.append(lambda elem: elem[ELEM_TYPE] in types)
+        if self.peers is not None:
+            peers = self.peers
+            checks.append(lambda elem: elem[ELEM_PEER] in peers)
+        if self.prefixes is not None:
+            prefixes = self.prefixes
+            checks.append(lambda elem: elem[ELEM_PREFIX] in prefixes)
+        if self.pairs is not None:
+            pairs = self.pairs
+            checks.append(lambda elem: (elem[ELEM_PEER], elem[ELEM_PREFIX]) in pairs)
+        if self.communities is not None:
+            matcher = CommunityMatcher(self.communities)
+            checks.append(lambda elem: matcher(elem[ELEM_COMMUNITIES]))
+
+        if len(checks) == 1:
+            return checks[0]
+        return lambda elem: all(check(elem) for check in checks)
+
+
+def _union_filter(filters):
+    # None - no filter - wins, as it matches every element
+    if not filters or any(element_filter is None for element_filter in filters):
+        return None
+    union = filters[0]
+    for element_filter in filters[1:]:
+        union = union.union(element_filter)
+    return union
+
+
+def _pybgpstream_records(fpath, data_type, filter_string=""):
+    """
+    Decode a single MRT file with pybgpstream.
+
+    Args:
+        fpath: Absolute path of the cache file
+        data_type: RIB_FILE or UPD_FILE
+        filter_string: BGPStream filter string, see ElementFilter.compile()
+
+    Yields:
+        A (timestamp, elements) pair for every record in the file, where elements is a list of element tuples
+    """
+    if pybgpstream is None:
+        raise ImportError(f"the {PYBGPSTREAM} backend requires pybgpstream, use backend={NATIVE!r} instead")
+    stream = pybgpstream.BGPStream(data_interface="singlefile")
+    stream.set_data_interface_option("singlefile", data_type, fpath)
+    if filter_string:
+        stream.parse_filter_string(filter_string)
+
+    for record in stream.records():
+        timestamp = record.time
+        elems = []
+        for entry in record:
+            fields = entry.fields
+            elems.append((entry.type, timestamp, entry.peer_address, fields.get("prefix"), fields.get("as-path"),
+                          fields.get("communities")))
+        yield timestamp, elems
+
+
+# Native MRT reader
+#
+# A pure Python decoder for the MRT records found in the cache files: TABLE_DUMP_V2 RIB entries and BGP4MP(_ET)
+# updates and state changes, optionally gzip or bzip2 compressed. Uncompressed files are memory-mapped and
+# compressed ones are inflated into a single buffer; records are decoded in place with struct.unpack_from, and only
+# the element fields an analysis asked for are turned into Python objects. Peers, prefixes, AS paths and community
+# sets repeat heavily, so each distinct raw value is only formatted once per file.
+
+MRT_TABLE_DUMP_V2 = 13
+MRT_BGP4MP = 16
+MRT_BGP4MP_ET = 17
+
+TD2_PEER_INDEX_TABLE = 1
+# TABLE_DUMP_V2 RIB subtypes -> (address family, whether the entries carry ADD-PATH path identifiers)
+TD2_RIB_SUBTYPES = {
+    2: (socket.AF_INET, False), 3: (socket.AF_INET, False), 4: (socket.AF_INET6, False), 5: (socket.AF_INET6, False),
+    8: (socket.AF_INET, True), 9: (socket.AF_INET, True), 10: (socket.AF_INET6, True), 11: (socket.AF_INET6, True),
+}
+
+BGP4MP_STATE_CHANGES = {0: 2, 5: 4}
+# BGP4MP message subtypes -> (AS number size, whether the NLRI carry ADD-PATH path identifiers)
+BGP4MP_MESSAGES = {1: (2, False), 4: (4, False), 6: (2, False), 7: (4, False),
+                   8: (2, True), 9: (4, True), 10: (2, True), 11: (4, True)}
+BGP_UPDATE = 2
+
+ATTR_AS_PATH = 2
+ATTR_COMMUNITIES = 8
+ATTR_MP_REACH_NLRI = 14
+ATTR_MP_UNREACH_NLRI = 15
+ATTR_AS4_PATH = 17
+ATTR_LARGE_COMMUNITY = 32
+
+AS_SET, AS_SEQUENCE, AS_CONFED_SEQUENCE, AS_CONFED_SET = 1, 2, 3, 4
+
+AFI_FAMILIES = {1: socket.AF_INET, 2: socket.AF_INET6}
+ADDRESS_SIZES = {socket.AF_INET: 4, socket.AF_INET6: 16}
+
+MRT_HEADER = struct.Struct(">IHHI")
+
+
+def _read_mrt(fpath):
+    """Return the uncompressed MRT bytes of a cache file as bytes or as a read-only mmap."""
+    with open(fpath, "rb") as f:
+        magic = f.read(3)
+        if magic[:2] == b"\x1f\x8b":
+            f.seek(0)
+            return gzip.decompress(f.read())
+        if magic == b"BZh":
+            f.seek(0)
+            return bz2.decompress(f.read())
+        if not magic:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _path_attributes(buf, off, end):
+    """Return a {type code: (start, end)} dict of the path attributes in buf[off:end]."""
+    attrs = {}
+    while off < end:
+        flags, code = buf[off], buf[off + 1]
+        if flags & 0x10:
+            length = (buf[off + 2] << 8) | buf[off + 3]
+            off += 4
+        else:
+            length = buf[off + 2]
+            off += 3
+        attrs[code] = (off, off + length)
+        off += length
+    return attrs
+
+
+def _as_path_segments(raw, asn_size):
+    segments = []
+    code = "H" if asn_size == 2 else "I"
+    off = 0
+    while off + 2 <= len(raw):
+        seg_type, count = raw[off], raw[off + 1]
+        segments.append((seg_type, struct.unpack_from(f">{count}{code}", raw, off + 2)))
+        off += 2 + count * asn_size
+    return segments
+
+
+def _merge_as4_path(segments, as4_segments):
+    # RFC 6793: the AS4_PATH of a 2-byte session replaces the trailing part of the AS_PATH it has the length of
+    def length(segs):
+        return sum(len(asns) if seg_type == AS_SEQUENCE else 1 if seg_type == AS_SET else 0
+                   for seg_type, asns in segs)
+
+    keep = length(segments) - length(as4_segments)
+    if keep < 0:
+        return segments
+    merged = []
+    for seg_type, asns in segments:
+        if keep <= 0:
+            break
+        if seg_type == AS_SEQUENCE:
+            merged.append((seg_type, asns[:keep]))
+            keep -= len(asns[:keep])
+        else:
+            merged.append((seg_type, asns))
+            keep -= seg_type == AS_SET
+    return merged + as4_segments
+
+
+def _format_as_path(segments):
+    # same notation as libbgpstream: sets in braces, confederation sequences in parentheses, confederation sets in
+    # brackets
+    parts = []
+    for seg_type, asns in segments:
+        if seg_type == AS_SEQUENCE:
+            parts.extend(map(str, asns))
+        elif seg_type == AS_SET:
+            parts.append("{" + ",".join(map(str, asns)) + "}")
+        elif seg_type == AS_CONFED_SEQUENCE:
+            parts.append("(" + " ".join(map(str, asns)) + ")")
+        elif seg_type == AS_CONFED_SET:
+            parts.append("[" + ",".join(map(str, asns)) + "]")
+    return " ".join(parts)
+
+
+def _format_communities(raw, large=b""):
+    # the standard communities 'asn:value' of raw, then the large ones 'global:local1:local2' of large; pybgpstream
+    # returns the communities as a set, so repeated ones are only reported once
+    communities = [f"{asn}:{value}" for asn, value in struct.iter_unpack(">HH", raw[:len(raw) & ~3])]
+    if large:
+        communities += [f"{global_admin}:{local1}:{local2}"
+                        for global_admin, local1, local2 in struct.iter_unpack(">III", large[:len(large) // 12 * 12])]
+    return tuple(dict.fromkeys(communities))
+
+
+class _NativeDecoder:
+    """Per-file decoding state: the RIB peer table and the caches of formatted values."""
+
+    def __init__(self, fields):
+        self.want_as_path = ELEM_AS_PATH in fields
+        self.want_communities = ELEM_COMMUNITIES in fields
+        self.peers = []
+        self.addresses = {}
+        self.prefixes = {}
+        self.as_paths = {}
+        self.communities = {}
+
+    def address(self, raw):
+        address = self.addresses.get(raw)
+        if address is None:
+            family = socket.AF_INET if len(raw) == 4 else socket.AF_INET6
+            address = self.addresses[raw] = socket.inet_ntop(family, raw)
+        return address
+
+    def nlri(self, buf, off, end, family, addpath):
+        """Return the list of prefixes encoded in buf[off:end]."""
+        prefixes = []
+        cache = self.prefixes
+        size = ADDRESS_SIZES[family]
+        while off < end:
+            if addpath:
+                off += 4
+            nbytes = (buf[off] + 7) >> 3
+            raw = buf[off:off + 1 + nbytes]
+            # the same bytes encode different prefixes in the two address families
+            key = (family, raw)
+            prefix = cache.get(key)
+            if prefix is None:
+                address = socket.inet_ntop(family, raw[1:].ljust(size, b"\0"))
+                prefix = cache[key] = f"{address}/{raw[0]}"
+            prefixes.append(prefix)
+            off += 1 + nbytes
+        return prefixes
+
+    def route_fields(self, buf, attrs, asn_size):
+        """Return the (as_path, communities) fields of a route, or None for the ones that weren't asked for."""
+        as_path = communities = None
+        if self.want_as_path:
+            span = attrs.get(ATTR_AS_PATH)
+            raw = buf[span[0]:span[1]] if span else b""
+            as4_span = attrs.get(ATTR_AS4_PATH) if asn_size == 2 else None
+            key = (raw, buf[as4_span[0]:as4_span[1]] if as4_span else None, asn_size)
+            as_path = self.as_paths.get(key)
+            if as_path is None:
+                segments = _as_path_segments(raw, asn_size)
+                if as4_span:
+                    segments = _merge_as4_path(segments, _as_path_segments(key[1], 4))
+                as_path = self.as_paths[key] = _format_as_path(segments)
+        if self.want_communities:
+            span = attrs.get(ATTR_COMMUNITIES)
+            raw = buf[span[0]:span[1]] if span else b""
+            large_span = attrs.get(ATTR_LARGE_COMMUNITY)
+            large = buf[large_span[0]:large_span[1]] if large_span else b""
+            # most routes carry no large communities, their raw standard communities alone are the key
+            key = (raw, large) if large else raw
+            communities = self.communities.get(key)
+            if communities is None:
+                communities = self.communities[key] = _format_communities(raw, large)
+        return as_path, communities
+
+    def peer_index_table(self, buf, off):
+        off += 4
+        view_name_length = struct.unpack_from(">H", buf, off)[0]
+        off += 2 + view_name_length
+        count = struct.unpack_from(">H", buf, off)[0]
+        off += 2
+        peers = []
+        for _ in range(count):
+            peer_type = buf[off]
+            off += 5
+            size = 16 if peer_type & 1 else 4
+            peers.append(self.address(buf[off:off + size]))
+            off += size + (4 if peer_type & 2 else 2)
+        self.peers = peers
+
+    def rib_entries(self, buf, off, end, timestamp, family, addpath):
+        off += 4
+        nbytes = (buf[off] + 7) >> 3
+        prefix = self.nlri(buf, off, off + 1 + nbytes, family, False)[0]
+        off += 1 + nbytes
+        count = struct.unpack_from(">H", buf, off)[0]
+        off += 2
+
+        elems = []
+        want_attrs = self.want_as_path or self.want_communities
+        as_path = communities = None
+        for _ in range(count):
+            peer_index = struct.unpack_from(">H", buf, off)[0]
+            off += 6 + (4 if addpath else 0)
+            attr_length = struct.unpack_from(">H", buf, off)[0]
+            off += 2
+            if want_attrs:
+                as_path, communities = self.route_fields(buf, _path_attributes(buf, off, off + attr_length), 4)
+            off += attr_length
+            elems.append(('R', timestamp, self.peers[peer_index], prefix, as_path, communities))
+        return elems
+
+    def bgp4mp(self, buf, off, end, timestamp, subtype):
+        if subtype in BGP4MP_STATE_CHANGES:
+            asn_size = BGP4MP_STATE_CHANGES[subtype]
+            addpath = False
+        elif subtype in BGP4MP_MESSAGES:
+            asn_size, addpath = BGP4MP_MESSAGES[subtype]
+        else:
+            return []
+
+        off += 2 * asn_size + 2
+        family = AFI_FAMILIES.get(struct.unpack_from(">H", buf, off)[0])
+        if family is None:
+            return []
+        size = ADDRESS_SIZES[family]
+        peer = self.address(buf[off + 2:off + 2 + size])
+        off += 2 + 2 * size
+
+        if subtype in BGP4MP_STATE_CHANGES:
+            return [('S', timestamp, peer, None, None, None)]
+        if end - off < 19 or buf[off + 18] != BGP_UPDATE:
+            return []
+
+        # BGP UPDATE: withdrawn routes, path attributes, NLRI
+        off += 19
+        withdrawn_length = struct.unpack_from(">H", buf, off)[0]
+        off += 2
+        withdrawn = self.nlri(buf, off, off + withdrawn_length, socket.AF_INET, addpath)
+        off += withdrawn_length
+        attr_length = struct.unpack_from(">H", buf, off)[0]
+        off += 2
+        attrs = _path_attributes(buf, off, off + attr_length)
+        announced = self.nlri(buf, off + attr_length, end, socket.AF_INET, addpath)
+
+        mp_unreach = attrs.get(ATTR_MP_UNREACH_NLRI)
+        if mp_unreach:
+            mp_family = AFI_FAMILIES.get(struct.unpack_from(">H", buf, mp_unreach[0])[0])
+            if mp_family is not None:
+                withdrawn += self.nlri(buf, mp_unreach[0] + 3, mp_unreach[1], mp_family, addpath)
+        mp_reach = attrs.get(ATTR_MP_REACH_NLRI)
+        if mp_reach:
+            mp_family = AFI_FAMILIES.get(struct.unpack_from(">H", buf, mp_reach[0])[0])
+            if mp_family is not None:
+                nlri_start = mp_reach[0] + 5 + buf[mp_reach[0] + 3]
+                announced += self.nlri(buf, nlri_start, mp_reach[1], mp_family, addpath)
+
+        elems = [('W', timestamp, peer, prefix, None, None) for prefix in withdrawn]
+        if announced:
+            as_path, communities = self.route_fields(buf, attrs, asn_size)
+            elems += [('A', timestamp, peer, prefix, as_path, communities) for prefix in announced]
+        return elems
+
+
+def _native_records(fpath, data_type, fields=ALL_FIELDS):
+    """
+    Decode a single MRT file with the native reader.
+
+    Args:
+        fpath: Absolute path of the cache file
+        data_type: RIB_FILE or UPD_FILE - the records are decoded by their MRT type, so this is only informative
+        fields: The ELEM_* fields to decode; as_path and communities are None unless asked for
+
+    Yields:
+        A (timestamp, elements) pair for every record in the file, where elements is a list of element tuples
+    """
+    buf = _read_mrt(fpath)
+    decoder = _NativeDecoder(fields)
+    try:
+        off, size = 0, len(buf)
+        while off + MRT_HEADER.size <= size:
+            timestamp, mrt_type, subtype, length = MRT_HEADER.unpack_from(buf, off)
+            off += MRT_HEADER.size
+            end = off + length
+            if end > size:
+                # truncated record at the end of the file
+                break
+            timestamp = float(timestamp)
+            body = off
+            if mrt_type == MRT_BGP4MP_ET:
+                timestamp += struct.unpack_from(">I", buf, off)[0] / 1e6
+                body += 4
+
+            if mrt_type == MRT_BGP4MP or mrt_type == MRT_BGP4MP_ET:
+                elems = decoder.bgp4mp(buf, body, end, timestamp, subtype)
+            elif mrt_type == MRT_TABLE_DUMP_V2 and subtype in TD2_RIB_SUBTYPES:
+                family, addpath = TD2_RIB_SUBTYPES[subtype]
+                elems = decoder.rib_entries(buf, body, end, timestamp, family, addpath)
+            elif mrt_type == MRT_TABLE_DUMP_V2 and subtype == TD2_PEER_INDEX_TABLE:
+                decoder.peer_index_table(buf, body)
+                elems = []
+            else:
+                elems = []
+            off = end
+            yield timestamp, elems
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+
+# Persistent columnar element cache
+#
+# The first time a file is decoded its elements are written to a sidecar file in the element cache directory. The
+# sidecar is a little-endian columnar layout that is memory-mapped on later runs:
+#
+#   header            magic, source size, source mtime (ns), data type, and the number of records, elements,
+#                     strings, community sets and community set members
+#   record_time       float64 per record
+#   record_size       uint32 per record, number of elements in the record
+#   elem_type         uint8 per element, the element type character
+#   elem_peer         uint32 per element, index into the string table
+#   elem_prefix       uint32 per element, index into the string table or NO_VALUE
+#   elem_as_path      uint32 per element, index into the string table or NO_VALUE
+#   elem_communities  uint32 per element, index into the community set table or NO_VALUE
+#   string_offsets    uint32 per string + 1, byte offsets into string_data
+#   set_offsets       uint32 per community set + 1, offsets into set_members
+#   set_members       uint32 per member, index into the string table
+#   string_data       utf-8 bytes of every string
+#
+# Every column starts on an 8 byte boundary. A sidecar whose size, mtime or data type does not match the source file
+# is ignored and rewritten.
+
+# the version in the magic changes whenever the decoded elements do, so that older sidecars are ignored and rewritten
+ELEMENT_CACHE_MAGIC = b"BGPMCOL2"
+ELEMENT_CACHE_HEADER = struct.Struct("<8sQq8sIIIII")
+NO_VALUE = 0xFFFFFFFF
+
+
+def _element_cache_path(cache_dir, fpath):
+    fpath = os.path.abspath(fpath)
+    digest = hashlib.sha1(fpath.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(fpath)}.{digest}.elements")
+
+
+def _aligned(nbytes):
+    return (nbytes + 7) & ~7
+
+
+def _load_element_cache(cache_path, fpath, data_type):
+    """
+    Memory-map the sidecar of a cache file.
+
+    Returns:
+        A generator of (timestamp, elements) pairs, or None if there is no valid sidecar for the current file
+    """
+    try:
+        stat = os.stat(fpath)
+        f = open(cache_path, "rb")
+    except OSError:
+        return None
+
+    with f:
+        if os.fstat(f.fileno()).st_size < ELEMENT_CACHE_HEADER.size:
+            return None
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, size, mtime_ns, kind, n_records, n_elems, n_strings, n_sets, n_members = \
+        ELEMENT_CACHE_HEADER.unpack_from(buf)
+    if (magic != ELEMENT_CACHE_MAGIC or size != stat.st_size or mtime_ns != stat.st_mtime_ns
+            or kind.rstrip(b"\0").decode() != data_type or sys.byteorder != "little"):
+        buf.close()
+        return None
+    return _iter_element_cache(buf, n_records, n_elems, n_strings, n_sets, n_members)
+
+
+def _iter_element_cache(buf, n_records, n_elems, n_strings, n_sets, n_members):
+    view = memoryview(buf)
+    offset = _aligned(ELEMENT_CACHE_HEADER.size)
+
+    def column(fmt, count, itemsize):
+        nonlocal offset
+        col = view[offset:offset + count * itemsize].cast(fmt)
+        offset += _aligned(count * itemsize)
+        return col
+
+    record_time = column("d", n_records, 8)
+    record_size = column("I", n_records, 4)
+    elem_type = column("B", n_elems, 1)
+    elem_peer = column("I", n_elems, 4)
+    elem_prefix = column("I", n_elems, 4)
+    elem_as_path = column("I", n_elems, 4)
+    elem_communities = column("I", n_elems, 4)
+    string_offsets = column("I", n_strings + 1, 4)
+    set_offsets = column("I", n_sets + 1, 4)
+    set_members = column("I", n_members, 4)
+    string_data = view[offset:]
+
+    # the string and community set tables are small next to the element columns, so they are decoded up front and
+    # every element shares the same str and tuple objects
+    strings = [str(string_data[string_offsets[i]:string_offsets[i + 1]], "utf-8") for i in range(n_strings)]
+    sets = [tuple(strings[m] for m in set_members[set_offsets[i]:set_offsets[i + 1]]) for i in range(n_sets)]
+    types = [chr(i) for i in range(256)]
+
+    try:
+        start = 0
+        for rec in range(n_records):
+            timestamp = record_time[rec]
+            end = start + record_size[rec]
+            elems = []
+            for i in range(start, end):
+                prefix, as_path, communities = elem_prefix[i], elem_as_path[i], elem_communities[i]
+                elems.append((types[elem_type[i]], timestamp, strings[elem_peer[i]],
+                              None if prefix == NO_VALUE else strings[prefix],
+                              None if as_path == NO_VALUE else strings[as_path],
+                              None if communities == NO_VALUE else sets[communities]))
+            start = end
+            yield timestamp, elems
+    finally:
+        # the columns are views into the mapping and have to be released before it can be closed
+        del record_time, record_size, elem_type, elem_peer, elem_prefix, elem_as_path, elem_communities
+        del string_offsets, set_offsets, set_members, string_data
+        view.release()
+        buf.close()
+
+
+def _atomic_write(path, writer):
+    """
+    Call writer with a binary file object and put the file in place at path once writer returns.
+
+    The file is written under a temporary name next to path and then renamed, so concurrent readers never see a
+    partial file and an interrupted write never leaves a truncated one behind.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            writer(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _write_element_cache(cache_path, fpath, data_type, records):
+    """
+    Pass the (timestamp, elements) pairs of records through unchanged while recording them, and write the sidecar of
+    fpath once the last record has been seen.
+    """
+    stat = os.stat(fpath)
+    record_time, record_size = array("d"), array("I")
+    elem_type, elem_peer, elem_prefix, elem_as_path, elem_communities = (
+        array("B"), array("I"), array("I"), array("I"), array("I"))
+    strings, sets = {}, {}
+
+    def intern(value):
+        if value is None:
+            return NO_VALUE
+        ndx = strings.get(value)
+        if ndx is None:
+            ndx = strings[value] = len(strings)
+        return ndx
+
+    def intern_set(communities):
+        if communities is None:
+            return NO_VALUE
+        members = tuple(sorted(intern(c) for c in communities))
+        ndx = sets.get(members)
+        if ndx is None:
+            ndx = sets[members] = len(sets)
+        return ndx
+
+    for timestamp, elems in records:
+        record_time.append(timestamp)
+        record_size.append(len(elems))
+        for elem_type_, _, peer, prefix, as_path, communities in elems:
+            elem_type.append(ord(elem_type_))
+            elem_peer.append(intern(peer))
+            elem_prefix.append(intern(prefix))
+            elem_as_path.append(intern(as_path))
+            elem_communities.append(intern_set(communities))
+        yield timestamp, elems
+
+    string_data = bytearray()
+    string_offsets = array("I", [0])
+    for value in strings:
+        string_data += value.encode("utf-8")
+        string_offsets.append(len(string_data))
+    set_offsets, set_members = array("I", [0]), array("I")
+    for members in sets:
+        set_members.extend(members)
+        set_offsets.append(len(set_members))
+
+    header = ELEMENT_CACHE_HEADER.pack(ELEMENT_CACHE_MAGIC, stat.st_size, stat.st_mtime_ns, data_type.encode(),
+                                       len(record_time), len(elem_type), len(strings), len(sets), len(set_members))
+    columns = [record_time, record_size, elem_type, elem_peer, elem_prefix, elem_as_path, elem_communities,
+               string_offsets, set_offsets, set_members]
+    if sys.byteorder != "little":
+        for col in columns:
+            col.byteswap()
+
+    def write(f):
+        for chunk in [header] + [col.tobytes() for col in columns]:
+            f.write(chunk)
+            f.write(b"\0" * (_aligned(len(chunk)) - len(chunk)))
+        f.write(string_data)
+
+    _atomic_write(cache_path, write)
+
+
+def _decode_records(fpath, data_type, backend, fields):
+    if backend == PYBGPSTREAM:
+        return _pybgpstream_records(fpath, data_type)
+    if backend == NATIVE:
+        return _native_records(fpath, data_type, fields)
+    raise ValueError(f"unknown backend {backend!r}, expected {PYBGPSTREAM!r} or {NATIVE!r}")
+
+
+def _filter_records(records, element_filter):
+    match = element_filter.predicate()
+    for timestamp, elems in records:
+        yield timestamp, [elem for elem in elems if match(elem)]
+
+
+def open_records(fpath, data_type, element_cache=None, backend=PYBGPSTREAM, fields=ALL_FIELDS, element_filter=None):
+    """
+    Yield the (timestamp, elements) pairs of a cache file, from its sidecar in element_cache when there is a valid
+    one, and from the given backend otherwise.
+
+    The native backend leaves the element fields that are not in fields as None. Sidecars are always written with
+    every field, so a cache filled by one analysis can be read by any other.
+
+    element_filter is compiled into a BGPStream filter string when pybgpstream decodes the file; whatever the filter
+    string can't express, and every filter on the other paths, is applied in Python. A filter that matches nothing
+    skips the file.
+    """
+    if element_filter is not None and element_filter.matches_nothing():
+        return iter(())
+
+    if element_cache is None and backend == PYBGPSTREAM and element_filter is not None:
+        filter_string, exact = element_filter.compile()
+        records = _pybgpstream_records(fpath, data_type, filter_string)
+        return records if exact else _filter_records(records, element_filter)
+
+    if element_cache is None:
+        records = _decode_records(fpath, data_type, backend, fields)
+    else:
+        cache_path = _element_cache_path(element_cache, fpath)
+        records = _load_element_cache(cache_path, fpath, data_type)
+        if records is None:
+            records = _write_element_cache(cache_path, fpath, data_type,
+                                           _decode_records(fpath, data_type, backend, ALL_FIELDS))
+    return records if element_filter is None else _filter_records(records, element_filter)
+
+
+class Analysis:
+    """
+    Base class for a consumer of the decoded element stream.
+
+    run_analyses() calls begin_file() before the first element of every file, consume() once per element and
+    end_file() after the last element of every file. result() returns the value of the corresponding task function.
+
+    get_state() and set_state() save and restore everything the analysis has accumulated between files, which is
+    what run_analyses(checkpoint=...) stores on disk.
+
+    fields lists the ELEM_* fields consume() reads besides the type, timestamp and peer; decoders that can skip the
+    others (the native backend) leave them as None.
+
+    element_filter() returns the ElementFilter of the elements consume() needs from the next file. An analysis whose
+    filter depends on the file itself sets discovery_filter: run_analyses() then first passes the elements matching
+    it to discover(), and only then asks for the element_filter() of the file.
+
+    Analyses split the AS path of every element themselves rather than look it up in a cache: each decoded path is a
+    new string, and hashing it for the lookup costs about as much as splitting it.
+    """
+    data_type = RIB_FILE
+    fields = ALL_FIELDS
+    discovery_filter = None
+
+    def begin_file(self, ndx, fpath):
+        pass
+
+    def consume(self, elem):
+        """Process one element, returning None or, if the element was skipped, one of the SKIP_* reasons."""
+        raise NotImplementedError
+
+    def end_file(self, ndx, fpath):
+        pass
+
+    def element_filter(self):
+        return None
+
+    def discover(self, elem):
+        pass
+
+    def result(self):
+        raise NotImplementedError
+
+    def get_state(self):
+        return dict(self.__dict__)
+
+    def set_state(self, state):
+        self.__dict__.update(state)
+
+
+class SnapshotAnalysis(Analysis):
+    """
+    Base class for an analysis whose per-file work is independent of every other file.
+
+    Subclasses keep the state of the file being read in self.snapshot, reduce it to a compact partial result in
+    finish_snapshot() and fold the partial results back together, in file order, in add_snapshot(). Because only the
+    partial results cross file boundaries, the files can be parsed in worker processes (see run_analyses(jobs=...)).
+    """
+
+    def new_snapshot(self):
+        raise NotImplementedError
+
+    def finish_snapshot(self):
+        raise NotImplementedError
+
+    def add_snapshot(self, ndx, partial):
+        raise NotImplementedError
+
+    def fresh(self):
+        """
+        Return a new analysis configured like this one but without its accumulated state. run_analyses() ships these
+        to the worker processes, so the state that the partials are merged into never leaves this process.
+        """
+        raise NotImplementedError
+
+    def begin_file(self, ndx, fpath):
+        self.snapshot = self.new_snapshot()
+
+    def end_file(self, ndx, fpath):
+        partial = self.finish_snapshot()
+        self.snapshot = None
+        self.add_snapshot(ndx, partial)
+
+
+class FileStats:
+    """Instrumentation counters of one input file."""
+
+    def __init__(self, fpath, names):
+        self.fpath = fpath
+        self.records = 0
+        self.elements = 0
+        # time spent getting the next record out of the stream, i.e. decoding
+        self.iterate_seconds = 0.0
+        # per analysis: time spent in the analysis and the number of elements it skipped per SKIP_* reason
+        self.analysis_seconds = {name: 0.0 for name in names}
+        self.skipped = {name: {} for name in names}
+        # with prefetching: time the analyses waited for decoded records (decoding is the bottleneck) and time the
+        # decoding thread waited for room in the full queue (back-pressure, the analyses are the bottleneck)
+        self.prefetch_wait_seconds = 0.0
+        self.prefetch_blocked_seconds = 0.0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class RunStats:
+    """
+    Instrumentation of run_analyses(): pass an instance as stats= to collect one FileStats per input file.
+
+    Without it run_analyses() takes a code path that doesn't touch any counters or clocks.
+    """
+
+    def __init__(self):
+        self.files = []
+
+    def summary(self):
+        """Return the totals over all files as a JSON serializable dict."""
+        total = {"files": len(self.files), "records": 0, "elements": 0, "iterate_seconds": 0.0,
+                 "analysis_seconds": {}, "skipped": {},
+                 "prefetch": {"wait_seconds": 0.0, "blocked_seconds": 0.0}}
+        prefetch = total["prefetch"]
+        for file_stats in self.files:
+            total["records"] += file_stats.records
+            total["elements"] += file_stats.elements
+            total["iterate_seconds"] += file_stats.iterate_seconds
+            prefetch["wait_seconds"] += file_stats.prefetch_wait_seconds
+            prefetch["blocked_seconds"] += file_stats.prefetch_blocked_seconds
+            for name, seconds in file_stats.analysis_seconds.items():
+                total["analysis_seconds"][name] = total["analysis_seconds"].get(name, 0.0) + seconds
+            for name, reasons in file_stats.skipped.items():
+                skipped = total["skipped"].setdefault(name, {})
+                for reason, count in reasons.items():
+                    skipped[reason] = skipped.get(reason, 0) + count
+        return total
+
+    def as_dict(self):
+        return {"summary": self.summary(), "files": [file_stats.as_dict() for file_stats in self.files]}
+
+
+def _analysis_names(analyses):
+    # the class name, numbered when the same analysis is registered more than once
+    names = []
+    for analysis in analyses:
+        name = type(analysis).__name__
+        if name in names:
+            name = f"{name}#{sum(n.split('#')[0] == name for n in names) + 1}"
+        names.append(name)
+    return names
+
+
+def _feed_records(records, analyses):
+    consumers = [analysis.consume for analysis in analyses]
+    if len(consumers) == 1:
+        # skip the inner fan-out loop for the common single task case
+        consume = consumers[0]
+        for _, elems in records:
+            for elem in elems:
+                consume(elem)
+    else:
+        for _, elems in records:
+            for elem in elems:
+                for consume in consumers:
+                    consume(elem)
+
+
+def _feed_records_instrumented(records, analyses, file_stats):
+    # the clock is read once per record and analysis, not once per element
+    perf_counter = time.perf_counter
+    names = list(file_stats.analysis_seconds)
+    consumers = [analysis.consume for analysis in analyses]
+    skipped = [file_stats.skipped[name] for name in names]
+    analysis_seconds = [0.0] * len(analyses)
+
+    records = iter(records)
+    while True:
+        begin = perf_counter()
+        record = next(records, None)
+        file_stats.iterate_seconds += perf_counter() - begin
+        if record is None:
+            break
+
+        elems = record[1]
+        file_stats.records += 1
+        file_stats.elements += len(elems)
+        for i, consume in enumerate(consumers):
+            counts = skipped[i]
+            begin = perf_counter()
+            for elem in elems:
+                reason = consume(elem)
+                if reason is not None:
+                    counts[reason] = counts.get(reason, 0) + 1
+            analysis_seconds[i] += perf_counter() - begin
+
+    for name, seconds in zip(names, analysis_seconds):
+        file_stats.analysis_seconds[name] += seconds
+
+
+def _timed_calls(methods, file_stats):
+    # call every bound method, adding its run time to the analysis it belongs to
+    results = []
+    for name, method in zip(file_stats.analysis_seconds, methods):
+        begin = time.perf_counter()
+        results.append(method())
+        file_stats.analysis_seconds[name] += time.perf_counter() - begin
+    return results
+
+
+def _open_filtered(fpath, data_type, analyses, element_cache, backend, fields):
+    # Filters pay off when libbgpstream applies them before any Python object is created. The native reader and the
+    # element cache produce every element anyway, and checking them in Python costs about as much as letting the
+    # analyses ignore them, so those paths are not filtered.
+    if backend != PYBGPSTREAM or element_cache is not None:
+        return open_records(fpath, data_type, element_cache, backend, fields)
+
+    # the discovery pass of the analyses that have one, then the union of the element filters of all analyses
+    discovering = [analysis for analysis in analyses if analysis.discovery_filter is not None]
+    if discovering:
+        discovery_filter = _union_filter([analysis.discovery_filter for analysis in discovering])
+        for _, elems in open_records(fpath, data_type, element_cache, backend, fields, discovery_filter):
+            for elem in elems:
+                for analysis in discovering:
+                    analysis.discover(elem)
+
+    element_filter = _union_filter([analysis.element_filter() for analysis in analyses])
+    return open_records(fpath, data_type, element_cache, backend, fields, element_filter)
+
+
+def _timed_open(open_file, file_stats):
+    # a discovery pass is decoding, so its time counts as iterating
+    begin = time.perf_counter()
+    records = open_file()
+    file_stats.iterate_seconds += time.perf_counter() - begin
+    return records
+
+
+def _process_file(ndx, fpath, analyses, open_file, file_stats):
+    # open_file returns the records of the file; it is called after begin_file(), which element filters depend on
+    if file_stats is None:
+        for analysis in analyses:
+            analysis.begin_file(ndx, fpath)
+        _feed_records(open_file(), analyses)
+        for analysis in analyses:
+            analysis.end_file(ndx, fpath)
+    else:
+        _timed_calls([partial(analysis.begin_file, ndx, fpath) for analysis in analyses], file_stats)
+        _feed_records_instrumented(_timed_open(open_file, file_stats), analyses, file_stats)
+        _timed_calls([partial(analysis.end_file, ndx, fpath) for analysis in analyses], file_stats)
+
+
+def _snapshot_worker(fpath, data_type, analyses, element_cache, backend, fields, instrument):
+    # runs in a worker process on fresh copies of the analyses and only ships the compact partials back
+    file_stats = FileStats(fpath, _analysis_names(analyses)) if instrument else None
+    if file_stats is None:
+        for analysis in analyses:
+            analysis.snapshot = analysis.new_snapshot()
+        _feed_records(_open_filtered(fpath, data_type, analyses, element_cache, backend, fields), analyses)
+        return [analysis.finish_snapshot() for analysis in analyses], None
+
+    snapshots = _timed_calls([analysis.new_snapshot for analysis in analyses], file_stats)
+    for analysis, snapshot in zip(analyses, snapshots):
+        analysis.snapshot = snapshot
+    records = _timed_open(partial(_open_filtered, fpath, data_type, analyses, element_cache, backend, fields),
+                          file_stats)
+    _feed_records_instrumented(records, analyses, file_stats)
+    return _timed_calls([analysis.finish_snapshot for analysis in analyses], file_stats), file_stats
+
+
+# records per queue item, so that the threads synchronize once per batch rather than once per record
+PREFETCH_BATCH = 256
+PREFETCH_QUEUE_DEPTH = 16
+
+
+class _Prefetcher:
+    """
+    Decode the files ahead of the analyses on background threads.
+
+    Every file gets a bounded queue of record batches. The thread pool picks the files up in order, so at most
+    `threads` files are decoded at once, and a thread that gets `depth` batches ahead of the analyses blocks until they
+    catch up. records(i) drains the queue of file i in the calling thread.
+
+    The threads only overlap with the analyses while they are outside the GIL: reading and decompressing the files,
+    and libbgpstream's C parsing. Files are decoded before the analyses have seen the files before them, so the element
+    filters of the analyses, which depend on that state, are not applied.
+    """
+
+    def __init__(self, cache_files, data_type, element_cache, backend, fields, threads,
+                 depth=PREFETCH_QUEUE_DEPTH):
+        self.stop = threading.Event()
+        self.queues = [queue.Queue(depth) for _ in cache_files]
+        self.wait_seconds = [0.0] * len(cache_files)
+        self.blocked_seconds = [0.0] * len(cache_files)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="bgpm-prefetch")
+        self.futures = [self.executor.submit(self._decode, i, fpath, data_type, element_cache, backend, fields)
+                        for i, fpath in enumerate(cache_files)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        # unblocks the decoding threads and drops the files that haven't been started
+        self.stop.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _put(self, i, item):
+        # returns False if the prefetcher was closed while waiting for room in the queue
+        q = self.queues[i]
+        try:
+            q.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        begin = time.perf_counter()
+        try:
+            while not self.stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        finally:
+            self.blocked_seconds[i] += time.perf_counter() - begin
+
+    def _decode(self, i, fpath, data_type, element_cache, backend, fields):
+        try:
+            batch = []
+            for record in open_records(fpath, data_type, element_cache, backend, fields):
+                batch.append(record)
+                if len(batch) == PREFETCH_BATCH:
+                    if not self._put(i, batch):
+                        return
+                    batch = []
+            if batch:
+                self._put(i, batch)
+        finally:
+            # end of file, also after an error - records() gets the exception from the future
+            self._put(i, None)
+
+    def records(self, i):
+        """Yield the records of file i, blocking until they are decoded."""
+        q = self.queues[i]
+        while True:
+            try:
+                batch = q.get_nowait()
+            except queue.Empty:
+                begin = time.perf_counter()
+                batch = q.get()
+                self.wait_seconds[i] += time.perf_counter() - begin
+            if batch is None:
+                break
+            yield from batch
+        self.futures[i].result()
+        self.queues[i] = None
+
+
+def _load_checkpoint(checkpoint, analyses):
+    """
+    Restore the state of analyses from a checkpoint file.
+
+    Returns:
+        The list of files that have already been fed to the analyses, or an empty list if there is no checkpoint yet
+    """
+    try:
+        with open(checkpoint, "rb") as f:
+            saved = pickle.load(f)
+    except FileNotFoundError:
+        return []
+
+    names = [type(analysis).__name__ for analysis in analyses]
+    if saved["analyses"] != names:
+        raise ValueError(f"checkpoint {checkpoint} was written for {saved['analyses']}, not {names}")
+    for analysis, state in zip(analyses, saved["states"]):
+        analysis.set_state(state)
+    return saved["files"]
+
+
+def _save_checkpoint(checkpoint, analyses, files):
+    saved = {
+        "analyses": [type(analysis).__name__ for analysis in analyses],
+        "states": [analysis.get_state() for analysis in analyses],
+        "files": files,
+    }
+    _atomic_write(checkpoint, partial(pickle.dump, saved))
+
+
+def run_analyses(cache_files, analyses, jobs=1, element_cache=None, checkpoint=None, stats=None,
+                 backend=PYBGPSTREAM, prefetch=0, queue_depth=PREFETCH_QUEUE_DEPTH):
+    """
+    Decode every input file exactly once and fan each element out to all of the given analyses.
+
+    Args:
+        cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        analyses: A list of Analysis instances that all consume the same kind of file
+        jobs: Number of worker processes used to parse files in parallel, or None for one per CPU. Only
+            SnapshotAnalysis instances can be parsed in parallel; their partial results are merged in file order.
+        element_cache: Directory of the persistent columnar element cache. Files with a valid sidecar there are read
+            from it without decoding the MRT data, the others are decoded and added to it. None disables the cache.
+        checkpoint: Path of a checkpoint file. If it exists, the analyses resume from the state saved in it and the
+            files it has already seen are skipped, so passing only newly arrived files gives the same results as a
+            full recompute. The updated state is saved back to it before the results are computed.
+        stats: A RunStats instance that collects per-file record and element counts, skipped elements and the time
+            spent decoding versus analysing. None disables the instrumentation.
+        backend: The MRT decoder, PYBGPSTREAM or NATIVE. Both produce the same elements; the native one only
+            decodes the fields the analyses declare and doesn't need pybgpstream to be installed.
+        prefetch: Number of files decoded ahead of the analyses on background threads when the files are parsed in
+            this process (jobs=1), which overlaps I/O, decompression and C parsing with the analyses of order dependent
+            tasks such as Task 3. 0 decodes each file when the analyses reach it. Element filters are not applied to
+            prefetched files.
+        queue_depth: Maximum number of batches of PREFETCH_BATCH records a prefetched file gets ahead of the analyses.
+            The stats report how long the analyses waited for records and how long the decoding waited for room.
+
+    Returns:
+        A list containing the result of every analysis, in the same order as analyses
+    """
+    data_types = {analysis.data_type for analysis in analyses}
+    if len(data_types) != 1:
+        raise ValueError(f"analyses must all consume the same kind of file, got {sorted(data_types)}")
+    data_type = data_types.pop()
+    fields = frozenset().union(*(analysis.fields for analysis in analyses))
+
+    processed = []
+    if checkpoint is not None:
+        processed = _load_checkpoint(checkpoint, analyses)
+        seen = set(processed)
+        cache_files = [fpath for fpath in cache_files if os.path.abspath(fpath) not in seen]
+    # files are numbered after the ones a checkpoint has already seen
+    first_ndx = len(processed)
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(cache_files))
+
+    if jobs > 1:
+        if not all(isinstance(analysis, SnapshotAnalysis) for analysis in analyses):
+            raise ValueError("only snapshot analyses can be parsed in parallel")
+
+        workers = [analysis.fresh() for analysis in analyses]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # map() yields the partials in submission order, which keeps the merge chronological
+            partials = executor.map(_snapshot_worker, cache_files, repeat(data_type), repeat(workers),
+                                    repeat(element_cache), repeat(backend), repeat(fields),
+                                    repeat(stats is not None))
+            for ndx, (file_partials, file_stats) in enumerate(partials, first_ndx):
+                for analysis, snapshot in zip(analyses, file_partials):
+                    analysis.add_snapshot(ndx, snapshot)
+                if stats is not None:
+                    stats.files.append(file_stats)
+    else:
+        names = _analysis_names(analyses)
+        prefetcher = None
+        if prefetch > 0 and cache_files:
+            prefetcher = _Prefetcher(cache_files, data_type, element_cache, backend, fields, prefetch, queue_depth)
+        try:
+            for i, fpath in enumerate(cache_files):
+                file_stats = None
+                if stats is not None:
+                    file_stats = FileStats(fpath, names)
+                    stats.files.append(file_stats)
+                if prefetcher is None:
+                    open_file = partial(_open_filtered, fpath, data_type, analyses, element_cache, backend, fields)
+                else:
+                    open_file = partial(prefetcher.records, i)
+                _process_file(first_ndx + i, fpath, analyses, open_file, file_stats)
+                if prefetcher is not None and file_stats is not None:
+                    file_stats.prefetch_wait_seconds = prefetcher.wait_seconds[i]
+                    file_stats.prefetch_blocked_seconds = prefetcher.blocked_seconds[i]
+        finally:
+            if prefetcher is not None:
+                prefetcher.close()
+
+    if checkpoint is not None:
+        _save_checkpoint(checkpoint, analyses, processed + [os.path.abspath(fpath) for fpath in cache_files])
+
+    return [analysis.result() for analysis in analyses]
+
+
+def _collector_records(collector, cache_files, data_type, element_cache, backend, fields):
+    # the records of one collector's files, one file after the other, with every peer made a (collector, peer) pair
+    for fpath in cache_files:
+        for timestamp, elems in open_records(fpath, data_type, element_cache, backend, fields):
+            yield timestamp, [elem[:ELEM_PEER] + ((collector, elem[ELEM_PEER]),) + elem[ELEM_PEER + 1:]
+                              for elem in elems]
+
+
+def merge_records(collector_files, data_type, element_cache=None, backend=PYBGPSTREAM, fields=ALL_FIELDS):
+    """
+    K-way merge the records of several collectors into one chronological stream.
+
+    Every collector's files are read lazily and in order, so only the next record of each collector is held while
+    a heap picks the earliest one. Records with the same timestamp come in the order of collector_files, and the
+    records of one collector always keep their order. Peers become (collector, peer address) pairs, so the same
+    peer seen by two collectors stays two peers.
+
+    Args:
+        collector_files: A dict {collector: chronologically sorted list of cache files}
+        data_type, element_cache, backend, fields: See open_records()
+    """
+    sources = [_collector_records(collector, cache_files, data_type, element_cache, backend, fields)
+               for collector, cache_files in collector_files.items()]
+    return heapq.merge(*sources, key=itemgetter(0))
+
+
+def run_merged_analyses(collector_files, analyses, element_cache=None, backend=PYBGPSTREAM):
+    """
+    Feed the merged stream of several collectors (see merge_records()) to the given analyses as if it were one file.
+
+    The merged stream has no file boundaries, so snapshot analyses and element filters don't apply; the results of
+    the event analyses are keyed by (collector, peer address) pairs.
+
+    Returns:
+        A list containing the result of every analysis, in the same order as analyses
+    """
+    if any(isinstance(analysis, SnapshotAnalysis) for analysis in analyses):
+        raise ValueError("snapshot analyses can't run on a merged stream")
+    data_types = {analysis.data_type for analysis in analyses}
+    if len(data_types) != 1:
+        raise ValueError(f"analyses must all consume the same kind of file, got {sorted(data_types)}")
+    data_type = data_types.pop()
+    fields = frozenset().union(*(analysis.fields for analysis in analyses))
+
+    for analysis in analyses:
+        analysis.begin_file(0, None)
+    _feed_records(merge_records(collector_files, data_type, element_cache, backend, fields), analyses)
+    for analysis in analyses:
+        analysis.end_file(0, None)
+    return [analysis.result() for analysis in analyses]
+
+
+def _split_by_collector(res):
+    # {(collector, peer): value} -> {collector: {peer: value}}
+    by_collector = {}
+    for (collector, peer_ip), value in res.items():
+        by_collector.setdefault(collector, {})[peer_ip] = value
+    return by_collector
+
+
+# Compact keys
+#
+# Prefixes and ASNs collected by the snapshot analyses are held as 64-bit integers and only turned back into strings
+# when results are returned:
+#   IPv4 prefix   length << 32 | address
+#   IPv6 prefix   1 << 63 | length << 56 | the top 56 bits of the address, for prefixes up to /56
+#   ASN           the AS number itself
+# Values that don't fit this encoding (longer IPv6 prefixes, AS_SET tokens such as "{1,2}") are kept as they are.
+
+def pack_prefix(prefix):
+    address, _, length = prefix.partition("/")
+    length = int(length)
+    if ":" not in address:
+        return (length << 32) | int.from_bytes(socket.inet_aton(address), "big")
+    if length > 56:
+        return prefix
+    return (1 << 63) | (length << 56) | int.from_bytes(socket.inet_pton(socket.AF_INET6, address)[:7], "big")
+
+
+def unpack_prefix(key):
+    if not isinstance(key, int):
+        return key
+    if key >> 63:
+        length = (key >> 56) & 0x7F
+        address = socket.inet_ntop(socket.AF_INET6, (key & ((1 << 56) - 1)).to_bytes(7, "big") + bytes(9))
+    else:
+        length = key >> 32
+        address = socket.inet_ntoa((key & 0xFFFFFFFF).to_bytes(4, "big"))
+    return f"{address}/{length}"
+
+
+def pack_asn(token):
+    return int(token) if token.isdigit() else token
+
+
+def pack_origin_prefix(pair):
+    origin, prefix = pair
+    return pack_asn(origin), pack_prefix(prefix)
+
+
+def _parse_numbers(text, sep):
+    # the unsigned integers of text, separated by sep, parsed by NumPy in one go, or None if text holds anything else
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        try:
+            return np.fromstring(text, dtype=np.uint64, sep=sep)
+        except ValueError:
+            return None
+
+
+def _pack_ipv4(prefixes):
+    # pack_prefix() of a list of IPv4 prefixes as a uint64 array, or None if one of them is not canonical
+    fields = _parse_numbers(".".join(prefixes).replace("/", "."), ".")
+    if fields is None or len(fields) != 5 * len(prefixes):
+        return None
+    fields = fields.reshape(-1, 5)
+    # the digits of the fields plus three dots and a slash must add up to the length of every prefix, which rules out
+    # leading zeros, white space and fields that ended up in the wrong prefix
+    digits = 4 + (1 + (fields >= 10) + (fields >= 100)).sum(axis=1)
+    lengths = np.fromiter(map(len, prefixes), dtype=np.int64, count=len(prefixes))
+    if (fields[:, :4] > 255).any() or (fields[:, 4] > 32).any() or (digits != lengths).any():
+        return None
+    return (fields[:, 4] << 32) | (fields[:, 0] << 24) | (fields[:, 1] << 16) | (fields[:, 2] << 8) | fields[:, 3]
+
+
+def _pack_numbers(tokens):
+    # pack_asn() of a list of tokens made of at most 19 digits as a uint64 array
+    return _parse_numbers(" ".join(tokens), " ")
+
+
+def pack_prefixes(prefixes):
+    """
+    pack_prefix() of a batch of distinct prefixes. The IPv4 prefixes are parsed together by NumPy, which is several
+    times faster than packing them one by one.
+
+    Returns:
+        A uint64 array of the packed IPv4 prefixes and a list of the prefixes left to pack_prefix(), all of them if one
+        of the IPv4 prefixes is not in canonical form
+    """
+    ipv4 = [prefix for prefix in prefixes if ":" not in prefix]
+    packed = _pack_ipv4(ipv4)
+    if packed is None:
+        return np.zeros(0, dtype=np.uint64), list(prefixes)
+    return packed, [] if len(ipv4) == len(prefixes) else [prefix for prefix in prefixes if ":" in prefix]
+
+
+def pack_asns(tokens):
+    """pack_asn() of a batch of distinct AS path tokens, as pack_prefixes() does for prefixes."""
+    numbers, rest = [], []
+    for token in tokens:
+        (numbers if len(token) < 20 and token.isdigit() else rest).append(token)
+    packed = _pack_numbers(numbers)
+    if packed is None or len(packed) != len(numbers):
+        return np.zeros(0, dtype=np.uint64), list(tokens)
+    return packed, rest
+
+
+def pack_origin_prefixes(pairs):
+    """pack_origin_prefix() of a batch of distinct (origin, prefix) pairs, as pack_prefixes() does for prefixes."""
+    simple, rest = [], []
+    for pair in pairs:
+        origin, prefix = pair
+        (simple if ":" not in prefix and len(origin) < 20 and origin.isdigit() else rest).append(pair)
+    origins = _pack_numbers([origin for origin, _ in simple])
+    prefixes = _pack_ipv4([prefix for _, prefix in simple])
+    if origins is None or prefixes is None or len(origins) != len(simple):
+        return np.zeros((0, 2), dtype=np.uint64), list(pairs)
+    return np.stack([origins, prefixes], axis=1), rest
+
+
+class PackedSet:
+    """
+    Set of packed 64-bit keys held in a sorted NumPy array instead of as Python objects.
+
+    add() and update() only put raw keys, such as prefix strings, into a buffer set. Once it holds flush_size distinct
+    keys they are packed with pack and queued as an array, and the queued arrays are merged into the sorted array once
+    they hold as many keys as it does. A snapshot is therefore held packed while it is read, with at most flush_size
+    raw keys at a time. With NumPy, pack_batch packs the whole buffer at once, e.g. pack_prefixes(), and pack only
+    gets the keys it leaves over. Without a pack function the keys are taken as they are, e.g. already packed. Without
+    NumPy the packed keys are kept in a set of ints. Keys that don't pack into an int go to a small overflow set.
+    """
+
+    def __init__(self, keys=(), pack=None, pack_batch=None, flush_size=1 << 16):
+        self.pack = pack
+        self.pack_batch = pack_batch
+        self.flush_size = flush_size
+        self.buffer = set()
+        self.overflow = set()
+        self.unique = set() if np is None else self._array([])
+        self.pending = []  # packed arrays not merged into unique yet
+        self.n_pending = 0
+        self.update(keys)
+
+    def add(self, key):
+        buffer = self.buffer
+        buffer.add(key)
+        if len(buffer) >= self.flush_size:
+            self.flush()
+
+    def update(self, keys):
+        buffer = self.buffer
+        buffer.update(keys)
+        if len(buffer) >= self.flush_size:
+            self.flush()
+
+    @staticmethod
+    def _is_packed(key):
+        return isinstance(key, int)
+
+    @staticmethod
+    def _array(ints):
+        return np.array(ints, dtype=np.uint64)
+
+    @staticmethod
+    def _unique(keys):
+        return _sorted_unique(keys)
+
+    def flush(self):
+        """Pack the keys of the buffer and queue them for the next merge."""
+        if not self.buffer:
+            return
+        keys = self.buffer
+        self.buffer = set()
+        if self.pack_batch is not None and np is not None:
+            packed, keys = self.pack_batch(list(keys))
+            self.pending.append(packed)
+            self.n_pending += len(packed)
+        if self.pack is not None:
+            keys = map(self.pack, keys)
+        ints = []
+        for key in keys:
+            if self._is_packed(key):
+                ints.append(key)
+            else:
+                self.overflow.add(key)
+        if np is None:
+            self.unique.update(ints)
+            return
+        self.pending.append(self._array(ints))
+        self.n_pending += len(ints)
+        # merging only once the queue has caught up with the merged keys keeps the merges linear overall
+        if self.n_pending >= max(len(self.unique), self.flush_size):
+            self._merge()
+
+    def _merge(self):
+        if self.pending:
+            self.unique = self._unique(np.concatenate([self.unique] + self.pending))
+            self.pending = []
+            self.n_pending = 0
+
+    def _settle(self):
+        self.flush()
+        if np is not None:
+            self._merge()
+
+    def __len__(self):
+        self._settle()
+        return len(self.unique) + len(self.overflow)
+
+    def contents(self):
+        """Return the (unique int keys, overflow set) pair, see _packed_difference()."""
+        self._settle()
+        return self.unique, self.overflow
+
+    def __iter__(self):
+        self._settle()
+        yield from (self.unique if np is None else self.unique.tolist())
+        yield from self.overflow
+
+
+class PackedPairSet(PackedSet):
+    """
+    Set of (first, second) pairs of packed 64-bit keys, such as (origin ASN, prefix), with two columns per pair.
+
+    pack maps a raw pair to a packed one, see pack_origin_prefix(), and pack_batch a list of them, see
+    pack_origin_prefixes().
+    """
+
+    @staticmethod
+    def _is_packed(pair):
+        return isinstance(pair[0], int) and isinstance(pair[1], int)
+
+    @staticmethod
+    def _array(pairs):
+        return np.array(pairs, dtype=np.uint64).reshape(-1, 2)
+
+    @staticmethod
+    def _unique(pairs):
+        return _sorted_unique(pairs)
+
+    def __iter__(self):
+        self._settle()
+        yield from (self.unique if np is None else map(tuple, self.unique.tolist()))
+        yield from self.overflow
+
+    def counts_by_first(self):
+        """Return a {first: number of pairs} dict."""
+        self._settle()
+        return _count_firsts(self.unique, self.overflow)
+
+
+def _sorted_unique(keys):
+    # np.unique() of a uint64 array or of an (n, 2) array of pairs in lexicographic order. np.unique() hashes 1-D
+    # arrays on NumPy 2 and sorts pairs as opaque rows, both several times slower than sorting the columns here.
+    if len(keys) < 2:
+        return keys
+    if keys.ndim == 1:
+        keys = np.sort(keys)
+        new = keys[1:] != keys[:-1]
+    else:
+        order = np.argsort(keys[:, 1], kind="stable")
+        keys = keys[order[np.argsort(keys[order, 0], kind="stable")]]
+        new = (keys[1:] != keys[:-1]).any(axis=1)
+    return keys[np.concatenate(([True], new))]
+
+
+def _count_firsts(pairs, overflow):
+    # {first: number of pairs} of the contents of a PackedPairSet, the int keys in ascending order with NumPy
+    counts = defaultdict(int)
+    if np is None:
+        for first, _ in pairs:
+            counts[first] += 1
+    else:
+        firsts, n = np.unique(pairs[:, 0], return_counts=True)
+        counts.update(zip(firsts.tolist(), n.tolist()))
+    for first, _ in overflow:
+        counts[first] += 1
+    return dict(counts)
+
+
+def _packed_difference(keys, other):
+    # the keys of a PackedSet or PackedPairSet that are not in other, both sorted unique NumPy arrays or both sets
+    if np is None:
+        return keys - other
+    if keys.ndim == 2:
+        rows = [("first", np.uint64), ("second", np.uint64)]
+        return keys[~np.isin(np.ascontiguousarray(keys).view(rows).ravel(),
+                             np.ascontiguousarray(other).view(rows).ravel(), assume_unique=True)]
+    return keys[~np.isin(keys, other, assume_unique=True)]
+
+
+# A PrefixTrie node is a list [address as an int, prefix length, value or None, child for bit 0, child for bit 1]
+NODE_KEY, NODE_LENGTH, NODE_VALUE, NODE_ZERO = range(4)
+
+
+def _parse_prefix(prefix):
+    # (address width in bits, address as an int with the host bits cleared, prefix length)
+    address, length = prefix.split("/")
+    length = int(length)
+    if ":" in address:
+        width, key = 128, int.from_bytes(socket.inet_pton(socket.AF_INET6, address), "big")
+    else:
+        width, key = 32, int.from_bytes(socket.inet_aton(address), "big")
+    if not 0 <= length <= width:
+        raise ValueError(f"invalid prefix {prefix!r}")
+    return width, key >> (width - length) << (width - length), length
+
+
+def _format_prefix(width, key, length):
+    if width == 32:
+        return f"{socket.inet_ntoa(key.to_bytes(4, 'big'))}/{length}"
+    return f"{socket.inet_ntop(socket.AF_INET6, key.to_bytes(16, 'big'))}/{length}"
+
+
+class PrefixTrie:
+    """
+    Path-compressed binary (Patricia) trie of IPv4 and IPv6 prefixes, mapping each stored prefix to a value.
+
+    Nodes only exist for stored prefixes and where two branches split, so there are fewer than two nodes per prefix,
+    and every query visits at most one node per bit of the prefix it asks about. Values can't be None.
+    """
+
+    def __init__(self):
+        self.roots = {32: [0, 0, None, None, None], 128: [0, 0, None, None, None]}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, prefix, value):
+        width, key, length = _parse_prefix(prefix)
+        node = self.roots[width]
+        while True:
+            if node[NODE_LENGTH] == length:
+                if node[NODE_VALUE] is None:
+                    self.size += 1
+                node[NODE_VALUE] = value
+                return
+
+            branch = NODE_ZERO + ((key >> (width - 1 - node[NODE_LENGTH])) & 1)
+            child = node[branch]
+            self.size += 1
+            if child is None:
+                node[branch] = [key, length, value, None, None]
+                return
+
+            # the number of leading bits the child and the new prefix have in common
+            common = min(child[NODE_LENGTH], length, width - (child[NODE_KEY] ^ key).bit_length())
+            if common == child[NODE_LENGTH]:
+                self.size -= 1
+                node = child
+                continue
+            if common == length:
+                # the new prefix covers the child
+                new = [key, length, value, None, None]
+            else:
+                # both hang off a new branching node
+                new = [key >> (width - common) << (width - common), common, None, None, None]
+                new[NODE_ZERO + ((key >> (width - 1 - common)) & 1)] = [key, length, value, None, None]
+            new[NODE_ZERO + ((child[NODE_KEY] >> (width - 1 - common)) & 1)] = child
+            node[branch] = new
+            return
+
+    def _node(self, width, key, length):
+        # the stored node of exactly this prefix, or None
+        node = self.roots[width]
+        while node is not None and node[NODE_LENGTH] < length:
+            node = node[NODE_ZERO + ((key >> (width - 1 - node[NODE_LENGTH])) & 1)]
+        if node is None or node[NODE_LENGTH] != length or node[NODE_KEY] != key:
+            return None
+        return node
+
+    def get(self, prefix, default=None):
+        node = self._node(*_parse_prefix(prefix))
+        return default if node is None or node[NODE_VALUE] is None else node[NODE_VALUE]
+
+    def lookup(self, prefix):
+        """
+        Longest prefix match: the most specific stored prefix that contains prefix, which may be prefix itself.
+
+        Returns:
+            A (stored prefix, value) pair, or None if no stored prefix contains prefix
+        """
+        width, key, length = _parse_prefix(prefix)
+        node = self.roots[width]
+        best = None
+        while node is not None and node[NODE_LENGTH] <= length and \
+                not (node[NODE_KEY] ^ key) >> (width - node[NODE_LENGTH]):
+            if node[NODE_VALUE] is not None:
+                best = node
+            if node[NODE_LENGTH] == length:
+                break
+            node = node[NODE_ZERO + ((key >> (width - 1 - node[NODE_LENGTH])) & 1)]
+        if best is None:
+            return None
+        return _format_prefix(width, best[NODE_KEY], best[NODE_LENGTH]), best[NODE_VALUE]
+
+    def more_specifics(self, prefix):
+        """Yield the (stored prefix, value) pairs of the stored prefixes strictly inside prefix, in address order."""
+        width, key, length = _parse_prefix(prefix)
+        node = self.roots[width]
+        while node is not None and node[NODE_LENGTH] < length:
+            if (node[NODE_KEY] ^ key) >> (width - node[NODE_LENGTH]):
+                return
+            node = node[NODE_ZERO + ((key >> (width - 1 - node[NODE_LENGTH])) & 1)]
+        if node is None or (node[NODE_KEY] ^ key) >> (width - length):
+            return
+
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node[NODE_VALUE] is not None and node[NODE_LENGTH] > length:
+                yield _format_prefix(width, node[NODE_KEY], node[NODE_LENGTH]), node[NODE_VALUE]
+            stack.extend(child for child in (node[NODE_ZERO + 1], node[NODE_ZERO]) if child is not None)
+
+
+class RibIndex:
+    """The PrefixTries of a series of RIB snapshots, see RoutingTable."""
+
+    def __init__(self, snapshots):
+        self.times = [timestamp for timestamp, _ in snapshots]
+        self.tries = [trie for _, trie in snapshots]
+
+    def lookup(self, prefix, timestamp):
+        """
+        Longest prefix match in the latest snapshot taken at or before timestamp, or in the first snapshot for earlier
+        times. Returns a (covering prefix, origin ASes) pair, or None.
+        """
+        if not self.tries:
+            return None
+        ndx = max(bisect.bisect_right(self.times, timestamp) - 1, 0)
+        return self.tries[ndx].lookup(prefix)
+
+
+HLL_PRECISION = 14
+SPLITMIX64_MASK = (1 << 64) - 1
+
+
+def _splitmix64(key):
+    # the splitmix64 finalizer, a bijective mix of a 64-bit key
+    z = (key + 0x9E3779B97F4A7C15) & SPLITMIX64_MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & SPLITMIX64_MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & SPLITMIX64_MASK
+    return z ^ (z >> 31)
+
+
+def _splitmix64_array(keys):
+    # the same on a uint64 NumPy array, where the multiplications wrap around
+    z = keys + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _bit_length_array(values):
+    # int.bit_length() of every value of a uint64 NumPy array, by binary search over the bit positions
+    lengths = np.zeros(values.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = values >= np.uint64(1 << shift)
+        lengths += high * shift
+        values = np.where(high, values >> np.uint64(shift), values)
+    return lengths + (values > 0)
+
+
+def _hash_other(key):
+    # keys that don't pack into an int, such as AS_SET tokens, hashed the same way in every process
+    return int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), "big")
+
+
+def _hll_sigma(x):
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _hll_tau(x):
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y = 1.0
+    z = 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    """
+    Sketch of the number of distinct keys added to it, in 2**precision one-byte registers.
+
+    The relative standard error of the estimate is about 1.04 / sqrt(2**precision): 0.81% with 16 KiB of registers
+    for the default precision of 14, 1.6% with 4 KiB for 12 and 0.41% with 64 KiB for 16, with no bias over the
+    whole range, and small cardinalities are nearly exact. Sketches of the same precision merge into the sketch of the
+    union of their keys, so they can be combined across files, collectors and worker processes.
+
+    Keys are buffered in an array('Q') and added to the registers with NumPy in batches. Packed int
+    keys are hashed with the splitmix64 finalizer and other keys with BLAKE2b, which give the same hashes in every
+    process.
+    """
+
+    def __init__(self, precision=HLL_PRECISION, flush_size=1 << 16):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"precision must be between 4 and 18, got {precision}")
+        self.precision = precision
+        self.flush_size = flush_size
+        self.registers = bytearray(1 << precision)
+        self.buffer = array("Q")
+
+    def add(self, key):
+        try:
+            self.buffer.append(key)
+        except (TypeError, OverflowError):
+            self._add_hash(_hash_other(key))
+            return
+        if len(self.buffer) >= self.flush_size:
+            self.flush()
+
+    def _add_hash(self, h):
+        # the top bits of the hash pick the register, which keeps the longest run of leading zeros of the rest
+        width = 64 - self.precision
+        rank = width - (h & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.registers[h >> width]:
+            self.registers[h >> width] = rank
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if np is None:
+            for key in self.buffer:
+                self._add_hash(_splitmix64(key))
+        else:
+            width = 64 - self.precision
+            hashes = _splitmix64_array(np.frombuffer(self.buffer, dtype=np.uint64))
+            ndx = (hashes >> np.uint64(width)).astype(np.intp)
+            ranks = width - _bit_length_array(hashes & np.uint64((1 << width) - 1)) + 1
+            np.maximum.at(np.frombuffer(self.registers, dtype=np.uint8), ndx, ranks.astype(np.uint8))
+        self.buffer = array("Q")
+
+    def merge(self, other):
+        """Fold another sketch of the same precision into this one and return this one."""
+        if other.precision != self.precision:
+            raise ValueError(f"can't merge sketches of precision {self.precision} and {other.precision}")
+        self.flush()
+        other.flush()
+        if np is None:
+            self.registers = bytearray(map(max, self.registers, other.registers))
+        else:
+            registers = np.frombuffer(self.registers, dtype=np.uint8)
+            np.maximum(registers, np.frombuffer(other.registers, dtype=np.uint8), out=registers)
+        return self
+
+    def estimate(self):
+        # Ertl's improved estimator ("New cardinality estimation algorithms for HyperLogLog sketches", 2017), which
+        # unlike the original estimator with linear counting has no bias where the two meet
+        self.flush()
+        m = len(self.registers)
+        width = 64 - self.precision
+        if np is None:
+            histogram = [0] * (width + 2)
+            for rank in self.registers:
+                histogram[rank] += 1
+        else:
+            histogram = np.bincount(np.frombuffer(self.registers, dtype=np.uint8), minlength=width + 2).tolist()
+        if histogram[0] == m:
+            return 0.0
+
+        z = m * _hll_tau(1 - histogram[width + 1] / m)
+        for rank in range(width, 0, -1):
+            z = 0.5 * (z + histogram[rank])
+        z += m * _hll_sigma(histogram[0] / m)
+        return m * m / (2 * math.log(2) * z)
+
+    def __len__(self):
+        return round(self.estimate())
+
+    def __getstate__(self):
+        self.flush()
+        return dict(self.__dict__)
+
+
+class DistinctCount(SnapshotAnalysis):
+    """
+    Base class of the analyses that count the distinct keys of every snapshot.
+
+    The keys of a snapshot are counted exactly in a PackedSet, which packs them in batches with pack_keys and one by one
+    with pack_key. With approximate=True they go into a HyperLogLog of the given precision instead, which only ships
+    its registers back from a worker process, and the sketches of all snapshots are kept in self.sketches so that they
+    can be merged, for instance across collectors.
+    """
+    pack_key = None
+    pack_keys = None
+
+    def __init__(self, approximate=False, precision=HLL_PRECISION):
+        self.counts = []
+        self.sketches = []
+        self.approximate = approximate
+        self.precision = precision
+
+    def new_snapshot(self):
+        if self.approximate:
+            return HyperLogLog(self.precision)
+        return PackedSet(pack=self.pack_key, pack_batch=self.pack_keys)
+
+    def fresh(self):
+        return type(self)(approximate=self.approximate, precision=self.precision)
+
+    def finish_snapshot(self):
+        return self.snapshot if self.approximate else len(self.snapshot)
+
+    def add_snapshot(self, ndx, partial):
+        if self.approximate:
+            self.sketches.append(partial)
+            partial = len(partial)
+        self.counts.append(partial)
+
+    def result(self):
+        return self.counts
+
+
+class UniquePrefixes(DistinctCount):
+    """Task 1A: number of unique prefixes per snapshot."""
+    fields = frozenset((ELEM_PREFIX,))
+    pack_key = staticmethod(pack_prefix)
+    pack_keys = staticmethod(pack_prefixes)
+
+    def consume(self, elem):
+        prefix = elem[ELEM_PREFIX]
+        if prefix is None:
+            return SKIP_NO_PREFIX
+        # the sketch hashes packed keys, the PackedSet packs the strings itself in batches
+        self.snapshot.add(pack_prefix(prefix) if self.approximate else prefix)
+
+
+class UniqueASes(DistinctCount):
+    """Task 1B: number of unique ASes seen in any AS path per snapshot."""
+    fields = frozenset((ELEM_AS_PATH,))
+    pack_key = staticmethod(pack_asn)
+    pack_keys = staticmethod(pack_asns)
+
+    def consume(self, elem):
+        as_path = elem[ELEM_AS_PATH]
+        if as_path is None:
+            return SKIP_NO_AS_PATH
+        if self.approximate:
+            add = self.snapshot.add
+            for asn in as_path.split():
+                add(pack_asn(asn))
+        else:
+            self.snapshot.update(as_path.split())
+
+
+class PrefixGrowth(SnapshotAnalysis):
+    """
+    Task 1C: top 10 origin ASes by growth of advertised prefixes between first and last appearance.
+
+    Only the prefix count of the first and of the latest snapshot an origin appeared in are kept, so memory depends
+    on the number of origins and not on the number of snapshots.
+    """
+    fields = frozenset((ELEM_PREFIX, ELEM_AS_PATH))
+
+    def __init__(self):
+        # packed origin -> number of prefixes in the first and in the latest snapshot the origin appeared in. An
+        # origin only gets a latest count once it has appeared in a second snapshot.
+        self.first = {}
+        self.last = {}
+
+    def new_snapshot(self):
+        # (origin AS, prefix) pairs
+        return PackedPairSet(pack=pack_origin_prefix, pack_batch=pack_origin_prefixes)
+
+    def fresh(self):
+        return PrefixGrowth()
+
+    def consume(self, elem):
+        as_path = elem[ELEM_AS_PATH]
+        if not as_path:
+            return SKIP_NO_AS_PATH
+        prefix = elem[ELEM_PREFIX]
+        if prefix is None:
+            return SKIP_NO_PREFIX
+        ass_path = as_path.split()
+        if not ass_path:
+            return SKIP_NO_AS_PATH
+
+        self.snapshot.add((ass_path[-1], prefix))
+
+    def finish_snapshot(self):
+        # packed origins in _origin_order, which decides between origins tied on growth (see SnapshotDeltaSeries)
+        return dict(sorted(self.snapshot.counts_by_first().items(), key=lambda item: _origin_order(item[0])))
+
+    def add_snapshot(self, ndx, partial):
+        first, last = self.first, self.last
+        for origin, count in partial.items():
+            if origin in first:
+                last[origin] = count
+            else:
+                first[origin] = count
+
+    def result(self):
+        # calculate growth rates for the origins seen in more than one snapshot
+        growth = ((origin, (c_2 - self.first[origin]) / self.first[origin]) for origin, c_2 in self.last.items())
+
+        # nlargest() keeps tied origins in their original order, just like the stable sort it replaces
+        top = heapq.nlargest(10, growth, key=lambda x: x[1])
+        top.reverse()
+        return [str(n) for n, _ in top]
+
+
+class ShortestPaths(SnapshotAnalysis):
+    """Task 2: shortest deduplicated AS path length per origin AS per snapshot."""
+    fields = frozenset((ELEM_AS_PATH,))
+
+    def __init__(self):
+        self.n_files = 0
+        self.by_origin = {}
+
+    def new_snapshot(self):
+        # keep track of min paths key: AS, value: min path len
+        return {}
+
+    def fresh(self):
+        return ShortestPaths()
+
+    def consume(self, elem):
+        as_path = elem[ELEM_AS_PATH]
+        if not as_path:
+            return SKIP_NO_AS_PATH
+        ass_path_arr = as_path.split()
+        if not ass_path_arr:
+            return SKIP_NO_AS_PATH
+
+        # get origin and count unique AS in path
+        origin = ass_path_arr[-1]
+        length = len(set(ass_path_arr))
+
+        # update path length
+        if length <= 1:
+            return SKIP_SINGLE_AS
+        min_paths = self.snapshot
+        if origin not in min_paths or length < min_paths[origin]:
+            min_paths[origin] = length
+
+    def finish_snapshot(self):
+        return self.snapshot
+
+    def add_snapshot(self, ndx, partial):
+        # update the snapshot, zero filling the files an origin was absent from
+        for origin, length in partial.items():
+            lengths = self.by_origin.get(origin)
+            if lengths is None:
+                lengths = self.by_origin[origin] = []
+            if len(lengths) < ndx:
+                lengths.extend([0] * (ndx - len(lengths)))
+            lengths.append(length)
+        self.n_files = ndx + 1
+
+    def result(self):
+        # final update
+        for lengths in self.by_origin.values():
+            if len(lengths) < self.n_files:
+                lengths.extend([0] * (self.n_files - len(lengths)))
+        return self.by_origin
+
+
+class RoutingTable(SnapshotAnalysis):
+    """
+    The origin ASes of every prefix of each snapshot, indexed in a PrefixTrie for longest-prefix-match queries.
+
+    The result is a RibIndex with one trie per file, stamped with the time of the earliest element of the file.
+    Origin ASes are kept as sorted tuples of strings, because a prefix can have several origins (MOAS).
+    """
+    fields = frozenset((ELEM_PREFIX, ELEM_AS_PATH))
+
+    def __init__(self):
+        self.snapshots = []
+
+    def new_snapshot(self):
+        # [earliest element time, prefix -> set of origin ASes]
+        return [None, {}]
+
+    def fresh(self):
+        return RoutingTable()
+
+    def consume(self, elem):
+        prefix = elem[ELEM_PREFIX]
+        if prefix is None:
+            return SKIP_NO_PREFIX
+        as_path = elem[ELEM_AS_PATH]
+        if as_path is None:
+            return SKIP_NO_AS_PATH
+        ass_path = as_path.split()
+        if not ass_path:
+            return SKIP_NO_AS_PATH
+
+        origin = ass_path[-1]
+        snapshot = self.snapshot
+        if snapshot[0] is None or elem[ELEM_TIME] < snapshot[0]:
+            snapshot[0] = elem[ELEM_TIME]
+        origins = snapshot[1].get(prefix)
+        if origins is None:
+            snapshot[1][prefix] = {origin}
+        else:
+            origins.add(origin)
+
+    def finish_snapshot(self):
+        timestamp, origins = self.snapshot
+        trie = PrefixTrie()
+        for prefix, prefix_origins in origins.items():
+            trie.insert(prefix, tuple(sorted(prefix_origins)))
+        return (0 if timestamp is None else timestamp), trie
+
+    def add_snapshot(self, ndx, partial):
+        self.snapshots.append(partial)
+
+    def result(self):
+        return RibIndex(self.snapshots)
+
+
+class SnapshotDelta:
+    """
+    The difference between one RIB snapshot and the one before it, see SnapshotDeltas.
+
+    added and removed hold the (packed origin, packed prefix) pairs that appeared or disappeared, in the form of
+    PackedPairSet.contents(). path_changes maps the origins whose Task 2 shortest path length changed to the new
+    length, 0 if the origin is gone.
+    """
+
+    def __init__(self, prefixes_added, prefixes_removed, added, removed, path_changes):
+        self.prefixes_added = prefixes_added
+        self.prefixes_removed = prefixes_removed
+        self.added = added
+        self.removed = removed
+        self.path_changes = path_changes
+
+    def added_by_origin(self):
+        return _count_firsts(*self.added)
+
+    def removed_by_origin(self):
+        return _count_firsts(*self.removed)
+
+
+class SnapshotDeltas(SnapshotAnalysis):
+    """
+    Consecutive RIB snapshots as deltas against the snapshot before.
+
+    Each file is parsed into the packed keys of Tasks 1A, 1C and 2, also in worker processes. add_snapshot() diffs
+    them against the previous snapshot, which it then replaces. Only the deltas and one snapshot are kept, so the
+    results derived by SnapshotDeltaSeries scale with the churn between snapshots rather than with their size.
+    """
+    fields = frozenset((ELEM_PREFIX, ELEM_AS_PATH))
+
+    def __init__(self):
+        self.deltas = []
+        self.previous = (PackedSet().contents(), PackedPairSet().contents(), {})
+
+    def new_snapshot(self):
+        # Task 1A prefixes, Task 1C (origin, prefix) pairs, Task 2 origin -> shortest path length
+        return (PackedSet(pack=pack_prefix, pack_batch=pack_prefixes),
+                PackedPairSet(pack=pack_origin_prefix, pack_batch=pack_origin_prefixes), {})
+
+    def fresh(self):
+        return SnapshotDeltas()
+
+    def consume(self, elem):
+        prefixes, pairs, min_paths = self.snapshot
+        prefix = elem[ELEM_PREFIX]
+        if prefix is not None:
+            prefixes.add(prefix)
+        as_path = elem[ELEM_AS_PATH]
+        if not as_path:
+            return SKIP_NO_AS_PATH
+        ass_path = as_path.split()
+        if not ass_path:
+            return SKIP_NO_AS_PATH
+        origin = ass_path[-1]
+
+        if prefix is not None:
+            pairs.add((origin, prefix))
+        length = len(set(ass_path))
+        if length > 1 and (origin not in min_paths or length < min_paths[origin]):
+            min_paths[origin] = length
+        if prefix is None:
+            return SKIP_NO_PREFIX
+
+    def finish_snapshot(self):
+        prefixes, pairs, min_paths = self.snapshot
+        return prefixes.contents(), pairs.contents(), min_paths
+
+    def add_snapshot(self, ndx, partial):
+        (prefixes, prefix_overflow), (pairs, pair_overflow), min_paths = partial
+        (old_prefixes, old_prefix_overflow), (old_pairs, old_pair_overflow), old_min_paths = self.previous
+
+        path_changes = {origin: length for origin, length in min_paths.items() if old_min_paths.get(origin) != length}
+        path_changes.update((origin, 0) for origin in old_min_paths if origin not in min_paths)
+        self.deltas.append(SnapshotDelta(
+            len(_packed_difference(prefixes, old_prefixes)) + len(prefix_overflow - old_prefix_overflow),
+            len(_packed_difference(old_prefixes, prefixes)) + len(old_prefix_overflow - prefix_overflow),
+            (_packed_difference(pairs, old_pairs), pair_overflow - old_pair_overflow),
+            (_packed_difference(old_pairs, pairs), old_pair_overflow - pair_overflow),
+            path_changes))
+        self.previous = partial
+
+    def result(self):
+        return SnapshotDeltaSeries(self.deltas)
+
+
+# The state of an origin while SnapshotDeltaSeries replays Task 1C:
+#   first       its prefix count in the first snapshot it appeared in
+#   count       its latest non-zero prefix count
+#   since       the snapshot since which it is present, or None while it is absent
+#   seen        the number of snapshots it was present in before that
+#   second      the second snapshot it appeared in, or None
+ORIGIN_FIRST, ORIGIN_COUNT, ORIGIN_SINCE, ORIGIN_SEEN, ORIGIN_SECOND = range(5)
+
+
+class SnapshotDeltaSeries:
+    """The per-snapshot results of Tasks 1A, 1C and 2 and the churn per origin, replayed from SnapshotDelta objects."""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def unique_prefix_counts(self):
+        """Task 1A."""
+        counts = []
+        count = 0
+        for delta in self.deltas:
+            count += delta.prefixes_added - delta.prefixes_removed
+            counts.append(count)
+        return counts
+
+    def top_10_by_prefix_growth(self):
+        """Task 1C."""
+        origins = {}  # packed origin -> ORIGIN_* fields
+
+        def leave(state, ndx):
+            length = ndx - state[ORIGIN_SINCE]
+            if state[ORIGIN_SECOND] is None and state[ORIGIN_SEEN] + length >= 2:
+                state[ORIGIN_SECOND] = state[ORIGIN_SINCE] + 1
+            state[ORIGIN_SEEN] += length
+            state[ORIGIN_SINCE] = None
+
+        counts = {}
+        for ndx, delta in enumerate(self.deltas):
+            added, removed = delta.added_by_origin(), delta.removed_by_origin()
+            for origin in set(added).union(removed):
+                count = counts.get(origin, 0) + added.get(origin, 0) - removed.get(origin, 0)
+                counts[origin] = count
+                state = origins.get(origin)
+                if count:
+                    if state is None:
+                        origins[origin] = [count, count, ndx, 0, None]
+                        continue
+                    if state[ORIGIN_SINCE] is None:
+                        if state[ORIGIN_SECOND] is None:
+                            state[ORIGIN_SECOND] = ndx
+                        state[ORIGIN_SINCE] = ndx
+                    state[ORIGIN_COUNT] = count
+                elif state is not None and state[ORIGIN_SINCE] is not None:
+                    leave(state, ndx)
+        for state in origins.values():
+            if state[ORIGIN_SINCE] is not None:
+                leave(state, len(self.deltas))
+
+        # the order in which PrefixGrowth meets the origins a second time, which decides the ties
+        repeated = sorted((origin for origin, state in origins.items() if state[ORIGIN_SECOND] is not None),
+                          key=lambda origin: (origins[origin][ORIGIN_SECOND], _origin_order(origin)))
+        growth = ((origin, (origins[origin][ORIGIN_COUNT] - origins[origin][ORIGIN_FIRST]) / origins[origin][ORIGIN_FIRST])
+                  for origin in repeated)
+        top = heapq.nlargest(10, growth, key=lambda x: x[1])
+        top.reverse()
+        return [str(n) for n, _ in top]
+
+    def shortest_paths(self):
+        """Task 2."""
+        by_origin = {}
+        for ndx, delta in enumerate(self.deltas):
+            for origin, length in delta.path_changes.items():
+                lengths = by_origin.get(origin)
+                if lengths is None:
+                    lengths = by_origin[origin] = []
+                # the length stays the same until it changes
+                lengths.extend([lengths[-1] if lengths else 0] * (ndx - len(lengths)))
+                lengths.append(length)
+        for lengths in by_origin.values():
+            lengths.extend([lengths[-1]] * (len(self.deltas) - len(lengths)))
+        return by_origin
+
+    def churn(self):
+        """
+        Return {origin AS: [(snapshot index, prefixes added, prefixes removed), ...]} with an entry for every
+        snapshot in which the prefixes of the origin changed. The first snapshot counts all of its prefixes as added.
+        """
+        series = {}
+        for ndx, delta in enumerate(self.deltas):
+            added, removed = delta.added_by_origin(), delta.removed_by_origin()
+            for origin in sorted(set(added).union(removed), key=_origin_order):
+                series.setdefault(str(origin), []).append((ndx, added.get(origin, 0), removed.get(origin, 0)))
+        return series
+
+
+def _origin_order(origin):
+    # packed ASNs in numerical order, then the tokens that don't pack, such as AS_SETs
+    return (0, origin, "") if isinstance(origin, int) else (1, 0, origin)
+
+
+# Tasks 3 and 4 only look at announcements and withdrawals
+ANNOUNCEMENTS_AND_WITHDRAWALS = ElementFilter(types=('A', 'W'))
+
+_MISSING = object()
+
+# the low 64 bits of the packed key of a spilled pair hold the packed prefix, the bits above them the peer
+UINT64_MASK = (1 << 64) - 1
+
+
+def _remove_spill(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _close_spill(connection, path):
+    connection.close()
+    _remove_spill(path)
+
+
+class OpenStateStore:
+    """
+    Memory-bounded map of the pending announcements of AWEvents and RTBHEvents, (peer, prefix) -> timestamp.
+
+    Once more than max_entries pairs are in memory, the spill_fraction of them that were announced the longest ago are
+    moved to a temporary SQLite table in spill_dir and loaded back if they are withdrawn, so a full-table peer whose
+    routes are never withdrawn doesn't hold them all in memory. Lookups give the same answers as a dict. In memory
+    the pairs are kept as they are; only spilled pairs are packed, with the peer interned to a small int and the
+    prefix packed with pack_prefix() if it unpacks into the same string.
+
+    A pickled store, e.g. in a checkpoint, holds the spilled pairs themselves, still packed, and spills them to a new
+    table in spill_dir when it is unpickled, so the checkpoint doesn't depend on any file besides its own.
+    """
+
+    def __init__(self, max_entries, spill_dir=None, spill_fraction=0.25):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be positive, got {max_entries}")
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir
+        self.spill_fraction = spill_fraction
+        self.peers = {}
+        self.peer_names = []
+        self.memory = {}  # (peer, prefix) -> timestamp, least recently announced first
+        self.on_disk = 0
+        self.spilled = 0
+        self.reloaded = 0
+        self.db = None
+
+    def _disk_key(self, key, intern=True):
+        # the packed key of a pair in the spill table, or None for a peer that has never been spilled
+        peer_ip, prefix = key
+        peer_id = self.peers.get(peer_ip)
+        if peer_id is None:
+            if not intern:
+                return None
+            peer_id = self.peers[peer_ip] = len(self.peer_names)
+            self.peer_names.append(peer_ip)
+        packed = pack_prefix(prefix)
+        if isinstance(packed, int) and unpack_prefix(packed) == prefix:
+            return str((peer_id << 64) | packed)
+        return f"{peer_id} {prefix}"
+
+    def _parse_disk_key(self, text):
+        if " " in text:
+            peer_id, prefix = text.split(" ", 1)
+            return self.peer_names[int(peer_id)], prefix
+        packed = int(text)
+        return self.peer_names[packed >> 64], unpack_prefix(packed & UINT64_MASK)
+
+    def _open(self):
+        fd, path = tempfile.mkstemp(prefix="bgpm-open-", suffix=".sqlite", dir=self.spill_dir)
+        os.close(fd)
+        # a scratch table: no journal, no syncing, one explicit transaction per spill
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode = OFF")
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute("CREATE TABLE spill (k TEXT PRIMARY KEY, t REAL) WITHOUT ROWID")
+        weakref.finalize(self, _close_spill, self.db, path)
+
+    def _spill(self):
+        memory = self.memory
+        cold = list(islice(memory.items(), max(1, int(len(memory) * self.spill_fraction))))
+        if self.db is None:
+            self._open()
+        self.db.execute("BEGIN")
+        self.db.executemany("INSERT OR REPLACE INTO spill VALUES (?, ?)",
+                            [(self._disk_key(key), timestamp) for key, timestamp in cold])
+        self.db.execute("COMMIT")
+        for key, _ in cold:
+            del memory[key]
+        self.on_disk += len(cold)
+        self.spilled += len(cold)
+
+    def _take_spilled(self, key):
+        disk_key = self._disk_key(key, intern=False)
+        if disk_key is None:
+            return None
+        row = self.db.execute("DELETE FROM spill WHERE k = ? RETURNING t", (disk_key,)).fetchone()
+        if row is None:
+            return None
+        self.on_disk -= 1
+        self.reloaded += 1
+        return row[0]
+
+    def __setitem__(self, key, timestamp):
+        memory = self.memory
+        if key in memory:
+            # move it to the recently announced end
+            del memory[key]
+        elif self.on_disk:
+            self._take_spilled(key)
+        memory[key] = timestamp
+        if len(memory) > self.max_entries:
+            self._spill()
+
+    def pop(self, key, default=_MISSING):
+        timestamp = self.memory.pop(key, None)
+        if timestamp is None and self.on_disk:
+            timestamp = self._take_spilled(key)
+        if timestamp is not None:
+            return timestamp
+        if default is _MISSING:
+            raise KeyError(key)
+        return default
+
+    def __contains__(self, key):
+        if key in self.memory:
+            return True
+        if not self.on_disk:
+            return False
+        disk_key = self._disk_key(key, intern=False)
+        return disk_key is not None and \
+            self.db.execute("SELECT 1 FROM spill WHERE k = ?", (disk_key,)).fetchone() is not None
+
+    def __len__(self):
+        return len(self.memory) + self.on_disk
+
+    def __iter__(self):
+        yield from list(self.memory)
+        if self.on_disk:
+            for text, in self.db.execute("SELECT k FROM spill").fetchall():
+                yield self._parse_disk_key(text)
+
+    def stats(self):
+        return {"in_memory": len(self.memory), "on_disk": self.on_disk, "spilled": self.spilled,
+                "reloaded": self.reloaded}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["db"] = None
+        # the spilled rows as they are on disk, so they don't have to be unpacked and packed again
+        state["spill"] = self.db.execute("SELECT k, t FROM spill").fetchall() if self.on_disk else []
+        return state
+
+    def __setstate__(self, state):
+        spill = state.pop("spill")
+        self.__dict__.update(state)
+        if not spill:
+            return
+        self._open()
+        self.db.execute("BEGIN")
+        self.db.executemany("INSERT INTO spill VALUES (?, ?)", spill)
+        self.db.execute("COMMIT")
+
+
+class AWEvents(Analysis):
+    """
+    Task 3: durations between the last announcement and the first withdrawal of each peer/prefix pair.
+
+    With on_event set, every closed event is passed to it as a (peer, prefix, duration) tuple instead of being kept,
+    so memory only holds the pending announcements (see stream_events()). With max_open set, at most that many
+    pending announcements are kept in memory and the others are spilled to disk (see OpenStateStore).
+    """
+    data_type = UPD_FILE
+    fields = frozenset((ELEM_PREFIX,))
+
+    def __init__(self, on_event=None, max_open=None, spill_dir=None):
+        self.durations = {}
+        # key: (peer IP, prefix), value: time of the most recent announcement
+        self.last_A = {} if max_open is None else OpenStateStore(max_open, spill_dir)
+        self.on_event = on_event
+
+    def element_filter(self):
+        return ANNOUNCEMENTS_AND_WITHDRAWALS
+
+    def consume(self, elem):
+        prefix = elem[ELEM_PREFIX]
+        if not prefix:
+            return SKIP_NO_PREFIX
+        k = (elem[ELEM_PEER], prefix)
+
+        # map the announcement and withdrawl times
+        elem_type = elem[ELEM_TYPE]
+        if elem_type == 'A':
+            self.last_A[k] = elem[ELEM_TIME]
+        elif elem_type == 'W':
+            start = self.last_A.pop(k, None)
+            if start is not None:
+                event_duration = elem[ELEM_TIME] - start
+                if event_duration > 0:
+                    self.add_event(k[0], prefix, event_duration)
+        else:
+            return SKIP_OTHER_TYPE
+
+    def add_event(self, peer_ip, prefix, event_duration):
+        # only pairs with a closed event get an entry, so there are no empty lists to filter out at the end
+        if self.on_event is not None:
+            self.on_event((peer_ip, prefix, event_duration))
+            return
+        durations = self.durations.get(peer_ip)
+        if durations is None:
+            durations = self.durations[peer_ip] = {}
+        event_durations = durations.get(prefix)
+        if event_durations is None:
+            durations[prefix] = [event_duration]
+        else:
+            event_durations.append(event_duration)
+
+    def result(self):
+        return self.durations
+
+
+class RTBHEvents(Analysis):
+    """
+    Task 4: durations of announcements tagged with a blackhole community until their withdrawal.
+
+    Only the pairs with a blackholed announcement pending from an earlier file, or with one in the current file,
+    can have an event in that file, so the discovery pass collects the latter and the file is filtered down to both.
+
+    An announcement is blackholed if one of its communities matches one of the patterns in communities, see
+    CommunityMatcher.
+    """
+    data_type = UPD_FILE
+    fields = frozenset((ELEM_PREFIX, ELEM_COMMUNITIES))
+
+    def __init__(self, on_event=None, max_open=None, spill_dir=None, communities=RTBH_COMMUNITIES):
+        self.rtbh_communities = CommunityMatcher(communities)
+        self.discovery_filter = ElementFilter(types=('A',), communities=communities)
+        self.durations = defaultdict(list)  # key: (peer IP, prefix), value: list of RTBH event durations
+        # keep track of the most recent blackholed announcement for each pair
+        self.last_A = {} if max_open is None else OpenStateStore(max_open, spill_dir)
+        self.discovered = set()  # pairs with a blackholed announcement in the current file
+        self.on_event = on_event  # see AWEvents
+
+    def begin_file(self, ndx, fpath):
+        self.discovered = set()
+
+    def discover(self, elem):
+        if elem[ELEM_TYPE] == 'A' and self.rtbh_communities(elem[ELEM_COMMUNITIES]):
+            self.discovered.add((elem[ELEM_PEER], elem[ELEM_PREFIX]))
+
+    def element_filter(self):
+        # listing the pending pairs would load the spilled ones back into memory, so once the store has spilled the
+        # file is only filtered down to announcements and withdrawals
+        if isinstance(self.last_A, OpenStateStore) and self.last_A.on_disk:
+            return ANNOUNCEMENTS_AND_WITHDRAWALS
+        return ElementFilter(types=('A', 'W'), pairs=self.discovered.union(self.last_A))
+
+    def consume(self, elem):
+        prefix = elem[ELEM_PREFIX]
+        if not prefix:
+            return SKIP_NO_PREFIX
+        k = (elem[ELEM_PEER], prefix)
+
+        elem_type = elem[ELEM_TYPE]
+        if elem_type == 'W':
+            start = self.last_A.pop(k, None)
+            if start is not None and elem[ELEM_TIME] - start > 0:
+                self.add_event(k, start, elem[ELEM_TIME])
+
+        elif elem_type == 'A':
+            # check for rtbh community
+            if self.rtbh_communities(elem[ELEM_COMMUNITIES]):
+                # store most recent rtbh
+                self.last_A[k] = elem[ELEM_TIME]
+            else:
+                # remove previous rtbh announcement
+                self.last_A.pop(k, None)
+        else:
+            return SKIP_OTHER_TYPE
+
+    def add_event(self, k, start, end):
+        event_duration = float(end - start)
+        if self.on_event is None:
+            self.durations[k].append(event_duration)
+        else:
+            self.on_event(k + (event_duration,))
+
+    def result(self):
+        # convert back to dict
+        res = {}
+        for (peer_ip, prefix), durations in self.durations.items():
+            if durations:
+                if peer_ip not in res:
+                    res[peer_ip] = {}
+                res[peer_ip][prefix] = durations
+        return res
+
+
+class AttributedRTBHEvents(RTBHEvents):
+    """
+    Task 4 events attributed to the route that covers the blackholed prefix.
+
+    Every event is looked up in the RIB snapshot in effect when the blackholed announcement was made (see RibIndex),
+    so a blackholed /32 is attributed to, e.g., the /24 it belongs to and that route's origin ASes.
+    """
+
+    def __init__(self, rib_index, communities=RTBH_COMMUNITIES):
+        super().__init__(communities=communities)
+        self.rib_index = rib_index
+
+    def add_event(self, k, start, end):
+        match = self.rib_index.lookup(k[1], start)
+        covering_prefix, origin_ases = (None, ()) if match is None else match
+        self.durations[k].append({"duration": float(end - start), "covering_prefix": covering_prefix,
+                                  "origin_ases": list(origin_ases)})
+
+
+class VectorizedEvents(Analysis):
+    """
+    Base class of the NumPy implementations of Tasks 3 and 4.
+
+    consume() only appends the interned peer and prefix ids, the timestamp and the kind of every element to typed
+    arrays. result() then finds the events of all peer/prefix pairs at once: after a stable sort by pair, an event
+    closes at every withdrawal whose preceding element of the same pair is an opening announcement, which is exactly
+    when the per-element state machine has an announcement pending.
+    """
+    data_type = UPD_FILE
+
+    WITHDRAWAL, ANNOUNCEMENT, OPENING_ANNOUNCEMENT = range(3)
+
+    def __init__(self):
+        if np is None:
+            raise ImportError("the vectorized event durations require NumPy")
+        self.peers = {}
+        self.prefixes = {}
+        self.peer_ids = array("I")
+        self.prefix_ids = array("I")
+        self.times = array("d")
+        self.kinds = array("B")
+
+    def kind(self, elem):
+        """Return the kind of an element that has a prefix, or None if it doesn't affect any event."""
+        raise NotImplementedError
+
+    def consume(self, elem):
+        prefix = elem[ELEM_PREFIX]
+        if not prefix:
+            return SKIP_NO_PREFIX
+        kind = self.kind(elem)
+        if kind is None:
+            return SKIP_OTHER_TYPE
+
+        peer_id = self.peers.get(elem[ELEM_PEER])
+        if peer_id is None:
+            peer_id = self.peers[elem[ELEM_PEER]] = len(self.peers)
+        prefix_id = self.prefixes.get(prefix)
+        if prefix_id is None:
+            prefix_id = self.prefixes[prefix] = len(self.prefixes)
+
+        self.peer_ids.append(peer_id)
+        self.prefix_ids.append(prefix_id)
+        self.times.append(elem[ELEM_TIME])
+        self.kinds.append(kind)
+
+    def result(self):
+        if not self.times:
+            return {}
+
+        pairs = np.frombuffer(self.peer_ids, dtype=np.uint32).astype(np.uint64) << np.uint64(32)
+        pairs |= np.frombuffer(self.prefix_ids, dtype=np.uint32)
+        order = np.argsort(pairs, kind="stable")
+        pairs = pairs[order]
+        times = np.frombuffer(self.times, dtype=np.float64)[order]
+        kinds = np.frombuffer(self.kinds, dtype=np.uint8)[order]
+
+        durations = times[1:] - times[:-1]
+        closes = ((pairs[1:] == pairs[:-1]) & (kinds[:-1] == self.OPENING_ANNOUNCEMENT)
+                  & (kinds[1:] == self.WITHDRAWAL) & (durations > 0))
+        ndx = np.flatnonzero(closes)
+
+        # turn the ids back into the nested {peer: {prefix: [durations]}} shape
+        peers, prefixes = list(self.peers), list(self.prefixes)
+        res = {}
+        for pair, duration in zip(pairs[ndx].tolist(), durations[ndx].tolist()):
+            peer_ip, prefix = peers[pair >> 32], prefixes[pair & 0xFFFFFFFF]
+            if peer_ip not in res:
+                res[peer_ip] = {}
+            if prefix not in res[peer_ip]:
+                res[peer_ip][prefix] = []
+            res[peer_ip][prefix].append(duration)
+        return res
+
+
+class AWEventsVectorized(VectorizedEvents):
+    """Task 3 on NumPy arrays: every announcement opens an event."""
+    fields = frozenset((ELEM_PREFIX,))
+
+    def element_filter(self):
+        return ANNOUNCEMENTS_AND_WITHDRAWALS
+
+    def kind(self, elem):
+        elem_type = elem[ELEM_TYPE]
+        if elem_type == 'A':
+            return self.OPENING_ANNOUNCEMENT
+        if elem_type == 'W':
+            return self.WITHDRAWAL
+        return None
+
+
+class RTBHEventsVectorized(VectorizedEvents):
+    """
+    Task 4 on NumPy arrays: only blackholed announcements open an event, any other announcement closes it.
+
+    The pending announcements are only known once result() runs, so the files are filtered down to every pair that
+    has had a blackholed announcement so far.
+    """
+    fields = frozenset((ELEM_PREFIX, ELEM_COMMUNITIES))
+
+    def __init__(self, communities=RTBH_COMMUNITIES):
+        super().__init__()
+        self.rtbh_communities = CommunityMatcher(communities)
+        self.discovery_filter = ElementFilter(types=('A',), communities=communities)
+        self.blackholed = set()
+
+    def discover(self, elem):
+        if elem[ELEM_TYPE] == 'A' and self.rtbh_communities(elem[ELEM_COMMUNITIES]):
+            self.blackholed.add((elem[ELEM_PEER], elem[ELEM_PREFIX]))
+
+    def element_filter(self):
+        return ElementFilter(types=('A', 'W'), pairs=self.blackholed)
+
+    def kind(self, elem):
+        elem_type = elem[ELEM_TYPE]
+        if elem_type == 'A':
+            if self.rtbh_communities(elem[ELEM_COMMUNITIES]):
+                return self.OPENING_ANNOUNCEMENT
+            return self.ANNOUNCEMENT
+        if elem_type == 'W':
+            return self.WITHDRAWAL
+        return None
+
+
+class CountMinSketch:
+    """
+    Count-min sketch of per-key counts in depth rows of width counters.
+
+    An estimate is never below the true count and, with probability 1 - exp(-depth), exceeds it by at most
+    e / width times the total of all counts: 0.13% of the total for the default width of 2048 and 98% of the time
+    for the default depth of 4. Keys are hashed with BLAKE2b, so sketches pickle into checkpoints unchanged.
+    """
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.counts = array("q", bytes(8 * width * depth))
+
+    def cells(self, key):
+        """The counter of key in every row, computed once per element for all the sketches it goes into."""
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, cells, count=1):
+        counts = self.counts
+        for cell in cells:
+            counts[cell] += count
+
+    def estimate(self, cells):
+        counts = self.counts
+        return min(counts[cell] for cell in cells)
+
+    def subtract(self, other):
+        """Remove the counts of a sketch with the same shape, for example a bucket leaving a window."""
+        counts = self.counts
+        for cell, count in enumerate(other.counts):
+            if count:
+                counts[cell] -= count
+
+
+class HeavyHitters:
+    """
+    Misra-Gries summary of the most frequent keys in at most capacity counters.
+
+    Every key that occurs more than total / (capacity + 1) times is kept; a full summary decrements all counters,
+    which is paid for by the increments before it, so updates take amortized O(1) time.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.counters = {}
+
+    def add(self, key):
+        counters = self.counters
+        if key in counters:
+            counters[key] += 1
+        elif len(counters) < self.capacity:
+            counters[key] = 1
+        else:
+            self.counters = {k: count - 1 for k, count in counters.items() if count > 1}
+
+
+class ChurnBucket:
+    """The update counts of one time bucket of a ChurnWindow."""
+
+    def __init__(self, width, depth, capacity):
+        self.announcements = 0
+        self.withdrawals = 0
+        self.peers = {}  # peer -> [announcements, withdrawals]
+        self.prefix_announcements = CountMinSketch(width, depth)
+        self.prefix_withdrawals = CountMinSketch(width, depth)
+        self.flaps = HeavyHitters(capacity)
+
+
+class ChurnWindow(Analysis):
+    """
+    Sliding-window update rates over the update stream.
+
+    The window is a ring of window_minutes * 60 / bucket_seconds time buckets. Every element goes into the bucket of
+    its timestamp and into running window totals, and a bucket that falls out of the window is subtracted from the
+    totals before its slot is reused, so every update takes amortized O(1) time and memory is bounded by the number
+    of buckets and peers. Per-prefix counts are CountMinSketch estimates, and the flapping prefixes are the candidates
+    of the HeavyHitters summaries of the buckets ranked by their window estimate. A flap is a withdrawal, the end of
+    one announce/withdraw cycle.
+
+    The queries answer for the window that ends with the latest bucket at any point of the stream, and with a
+    checkpoint (see run_analyses()) the window carries over to newly arrived files without reading the earlier ones
+    again. Elements older than the window are skipped.
+    """
+    data_type = UPD_FILE
+    fields = frozenset((ELEM_PREFIX,))
+
+    def __init__(self, window_minutes=15, bucket_seconds=60, top=10, width=2048, depth=4, capacity=256):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = [None] * max(1, round(window_minutes * 60 / bucket_seconds))
+        self.top = top
+        self.width, self.depth, self.capacity = width, depth, capacity
+        self.first = self.current = None  # the first and the latest bucket number
+        self.announcements = 0
+        self.withdrawals = 0
+        self.peers = {}
+        self.prefix_announcements = CountMinSketch(width, depth)
+        self.prefix_withdrawals = CountMinSketch(width, depth)
+
+    def element_filter(self):
+        return ANNOUNCEMENTS_AND_WITHDRAWALS
+
+    def advance(self, number):
+        # move the window forward to end with bucket number, expiring the buckets that fall out of it
+        n = len(self.buckets)
+        if self.current is None:
+            self.first = number
+        else:
+            for expired in range(max(self.current + 1, number - n + 1), number + 1):
+                bucket = self.buckets[expired % n]
+                if bucket is not None:
+                    self.expire(bucket)
+                    self.buckets[expired % n] = None
+        self.current = number
+
+    def expire(self, bucket):
+        self.announcements -= bucket.announcements
+        self.withdrawals -= bucket.withdrawals
+        for peer_ip, (announcements, withdrawals) in bucket.peers.items():
+            counts = self.peers[peer_ip]
+            counts[0] -= announcements
+            counts[1] -= withdrawals
+            if not counts[0] and not counts[1]:
+                del self.peers[peer_ip]
+        self.prefix_announcements.subtract(bucket.prefix_announcements)
+        self.prefix_withdrawals.subtract(bucket.prefix_withdrawals)
+
+    def consume(self, elem):
+        elem_type = elem[ELEM_TYPE]
+        if elem_type != 'A' and elem_type != 'W':
+            return SKIP_OTHER_TYPE
+        prefix = elem[ELEM_PREFIX]
+        if not prefix:
+            return SKIP_NO_PREFIX
+
+        number = int(elem[ELEM_TIME] // self.bucket_seconds)
+        if self.current is None or number > self.current:
+            self.advance(number)
+        elif number <= self.current - len(self.buckets):
+            return SKIP_OUTSIDE_WINDOW
+        slot = number % len(self.buckets)
+        bucket = self.buckets[slot]
+        if bucket is None:
+            bucket = self.buckets[slot] = ChurnBucket(self.width, self.depth, self.capacity)
+
+        peer_ip = elem[ELEM_PEER]
+        peer_counts = bucket.peers.get(peer_ip)
+        if peer_counts is None:
+            peer_counts = bucket.peers[peer_ip] = [0, 0]
+        window_counts = self.peers.get(peer_ip)
+        if window_counts is None:
+            window_counts = self.peers[peer_ip] = [0, 0]
+        cells = self.prefix_announcements.cells(prefix)
+        if elem_type == 'A':
+            bucket.announcements += 1
+            self.announcements += 1
+            peer_counts[0] += 1
+            window_counts[0] += 1
+            bucket.prefix_announcements.add(cells)
+            self.prefix_announcements.add(cells)
+        else:
+            bucket.withdrawals += 1
+            self.withdrawals += 1
+            peer_counts[1] += 1
+            window_counts[1] += 1
+            bucket.prefix_withdrawals.add(cells)
+            self.prefix_withdrawals.add(cells)
+            bucket.flaps.add(prefix)
+
+    def window_minutes(self):
+        """The length of the part of the stream the window covers so far, in minutes."""
+        if self.current is None:
+            return 0.0
+        return min(len(self.buckets), self.current - self.first + 1) * self.bucket_seconds / 60
+
+    def _per_minute(self, announcements, withdrawals):
+        minutes = self.window_minutes() or 1.0
+        return {"announcements_per_minute": announcements / minutes, "withdrawals_per_minute": withdrawals / minutes}
+
+    def rates(self):
+        return self._per_minute(self.announcements, self.withdrawals)
+
+    def peer_rates(self):
+        return {peer_ip: self._per_minute(*counts) for peer_ip, counts in self.peers.items()}
+
+    def prefix_rates(self, prefix):
+        cells = self.prefix_announcements.cells(prefix)
+        return self._per_minute(self.prefix_announcements.estimate(cells), self.prefix_withdrawals.estimate(cells))
+
+    def top_flapping(self, k=None):
+        """The k prefixes with the most withdrawals in the window, as (prefix, estimated withdrawals) pairs."""
+        candidates = set()
+        for bucket in self.buckets:
+            if bucket is not None:
+                candidates.update(bucket.flaps.counters)
+        flaps = ((prefix, self.prefix_withdrawals.estimate(self.prefix_withdrawals.cells(prefix)))
+                 for prefix in candidates)
+        return heapq.nlargest(self.top if k is None else k, flaps, key=lambda x: (x[1], x[0]))
+
+    def result(self):
+        end = None if self.current is None else (self.current + 1) * self.bucket_seconds
+        return {"window_end": end, "window_minutes": self.window_minutes(), "rates": self.rates(),
+                "peer_rates": self.peer_rates(), "top_flapping": self.top_flapping()}
+
+
+def stream_events(cache_files, analysis, element_cache=None, backend=PYBGPSTREAM):
+    """
+    Feed the files to an event analysis and yield its events as they close.
+
+    Args:
+        cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        analysis: An analysis with an on_event hook, such as AWEvents or RTBHEvents
+        element_cache: See run_analyses()
+        backend: See run_analyses()
+
+    Yields:
+        A (peer, prefix, duration) tuple for every event, in the order the events close. The analysis only keeps its
+        pending announcements, so memory doesn't grow with the number of events.
+    """
+    if not hasattr(analysis, "on_event"):
+        raise ValueError(f"{type(analysis).__name__} doesn't stream its events")
+    closed = []
+    analysis.on_event = closed.append
+    consume = analysis.consume
+    for ndx, fpath in enumerate(cache_files):
+        analysis.begin_file(ndx, fpath)
+        for _, elems in _open_filtered(fpath, analysis.data_type, [analysis], element_cache, backend,
+                                       analysis.fields):
+            for elem in elems:
+                consume(elem)
+            if closed:
+                yield from closed
+                closed.clear()
+        analysis.end_file(ndx, fpath)
+
+
+def write_events(events, fpath):
+    """
+    Write (peer, prefix, duration) events to a JSON Lines file as they arrive, one [peer, prefix, duration] array per
+    line, and return the number of events written.
+    """
+    count = 0
+    with open(fpath, "w") as f:
+        for event in events:
+            f.write(json.dumps(event))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def read_events(fpath):
+    """Yield the (peer, prefix, duration) events of a file written by write_events()."""
+    with open(fpath) as f:
+        for line in f:
+            peer_ip, prefix, duration = json.loads(line)
+            yield peer_ip, prefix, duration
+
+
+def events_to_durations(events):
+    """Collect (peer, prefix, duration) events into the nested dict returned by the Task 3 and Task 4 functions."""
+    res = {}
+    for peer_ip, prefix, duration in events:
+        res.setdefault(peer_ip, {}).setdefault(prefix, []).append(duration)
+    return res
+
 
 # Task 1A: Unique Advertised Prefixes Over Time
-def unique_prefixes_by_snapshot(cache_files):
+def unique_prefixes_by_snapshot(cache_files, approximate=False, precision=HLL_PRECISION, **options):
     """
     Retrieve the number of unique IP prefixes from each of the input BGP data files.
 
     Args:
         cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        approximate: Estimate the counts with HyperLogLog sketches, which use 2**precision bytes per file instead of
+            memory proportional to the number of unique IP prefixes
+        precision: Precision of the sketches, see HyperLogLog for the error bound
+        options: Keyword arguments passed on to run_analyses(), such as backend, jobs, element_cache or stats
 
     Returns:
         A list containing the number of unique IP prefixes for each input file.
         For example: [2, 5]
     """
-    # the required return type is 'list' - you are welcome to define additional data structures, if needed
-    unique_prefixes_by_snapshot = []
-
-    for fpath in cache_files:
-        stream = pybgpstream.BGPStream(data_interface="singlefile")
-        stream.set_data_interface_option("singlefile", "rib-file", fpath)
-
-        # implement your solution here
-        unique_prefixes = set()
-
-        # parse the records in the stream
-        for record in stream.records():
-            
-            
-            while True:
-                entry = record.get_next_elem()
-                if entry is None: 
-                    break
-  
-                if 'prefix' in entry.fields:
-                    prefix = entry.fields['prefix']
-                    unique_prefixes.add(prefix)
-                      
-        unique_prefixes_by_snapshot.append(len(unique_prefixes))
-    return unique_prefixes_by_snapshot
+    # the required return type is 'list' - see UniquePrefixes for the implementation
+    return run_analyses(cache_files, [UniquePrefixes(approximate=approximate, precision=precision)], **options)[0]
 
 
 # Task 1B: Unique Autonomous Systems Over Time
-def unique_ases_by_snapshot(cache_files):
+def unique_ases_by_snapshot(cache_files, approximate=False, precision=HLL_PRECISION, **options):
     """
     Retrieve the number of unique ASes from each of the input BGP data files.
 
     Args:
         cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        approximate: Estimate the counts with HyperLogLog sketches, which use 2**precision bytes per file instead of
+            memory proportional to the number of unique ASes
+        precision: Precision of the sketches, see HyperLogLog for the error bound
+        options: Keyword arguments passed on to run_analyses(), such as backend, jobs, element_cache or stats
 
     Returns:
         A list containing the number of unique ASes for each input file.
         For example: [2, 5]
     """
-    # the required return type is 'list' - you are welcome to define additional data structures, if needed
-    unique_ases_by_snapshot = []
-
-    for fpath in cache_files:
-        stream = pybgpstream.BGPStream(data_interface="singlefile")
-        stream.set_data_interface_option("singlefile", "rib-file", fpath)
-
-        # implement your solution here
-        unique_asses = set()
-
-        # process each record
-        for record in stream.records():
-            for entry in record: 
-                if 'as-path' in entry.fields:
-                    as_path = entry.fields['as-path']
-                    # parse the AS path
-                    for part in as_path.split():
-                        unique_asses.add(part)
-        unique_ases_by_snapshot.append(len(unique_asses))
-    return unique_ases_by_snapshot
+    # the required return type is 'list' - see UniqueASes for the implementation
+    return run_analyses(cache_files, [UniqueASes(approximate=approximate, precision=precision)], **options)[0]
 
 
 # Task 1C: Top-10 Origin AS by Prefix Growth
-def top_10_ases_by_prefix_growth(cache_files):
+def top_10_ases_by_prefix_growth(cache_files, **options):
     """
     Compute the top 10 origin ASes ordered by percentage increase of advertised prefixes (smallest to largest)
 
     Args:
         cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        options: Keyword arguments passed on to run_analyses(), such as backend, jobs, element_cache or stats
 
     Returns:
         A list of the top 10 origin ASes ordered by percentage increase of advertised prefixes (smallest to largest)
@@ -101,80 +3183,12 @@ def top_10_ases_by_prefix_growth(cache_files):
           corresponds to AS "777" as having the smallest percentage increase (of the top ten) and AS "6" having the
           highest percentage increase (of the top ten).
     """
-    # the required return type is 'list' - you are welcome to define additional data structures, if needed
-    top_10_ases_by_prefix_growth = []
-    
-    # track prefix/origin globally
-    #mp_snapshot = defaultdict(lambda: defaultdict(set))
-
-    for ndx, fpath in enumerate(cache_files):
-        stream = pybgpstream.BGPStream(data_interface="singlefile")
-        stream.set_data_interface_option("singlefile", "rib-file", fpath)
-        prefixes = {}
-        # implement your solution here
-        # mp = defaultdict(set) # map the origin AS to the prefix
-        # process each record
-        for record in stream.records():
-            for entry in record:   
-                if 'as-path' in entry.fields and entry.fields['as-path'] and 'prefix' in entry.fields:
-                    ass_path = entry.fields['as-path'].split()
-                    if not ass_path:
-                        continue
-
-                    prefix = entry.fields["prefix"]
-                    origin = ass_path[-1]
-
-                    if origin not in prefixes:
-                        prefixes[origin] = set()
-                    prefixes[origin].add(prefix)
-        top_10_ases_by_prefix_growth.append(prefixes)
-
-    # calculate growth rates
-    growth = {}
-
-    unique_ass = set()
-
-    for elt in top_10_ases_by_prefix_growth:
-        unique_ass.update(elt.keys())
-    
-    # find first and last appearance and calculate growth
-    for origin_as in unique_ass:
-        # find 1st appearance
-        idx_1 = None
-        for i, a in enumerate(top_10_ases_by_prefix_growth):
-            if origin_as in a:
-                idx_1 = i
-                break
-        
-        if idx_1 is None:
-            continue
-
-        # find last
-        idx_2 = None
-        for i in range(len(top_10_ases_by_prefix_growth)-1,-1,-1):
-            if origin_as in top_10_ases_by_prefix_growth[i]:
-                idx_2 = i
-                break
-
-        if idx_2 is None or idx_1 == idx_2:
-            continue
-
-        c_1 = len(top_10_ases_by_prefix_growth[idx_1][origin_as])
-        c_2 = len(top_10_ases_by_prefix_growth[idx_2][origin_as])
-
-        if c_1 > 0:
-            percentage = (c_2 - c_1) / c_1
-            growth[origin_as] = percentage
-
-
-    # sort top 10
-    top = sorted(growth.items(), key=lambda x:-x[1])[:10]
-    top.reverse()
-    return [n for n,_ in top]
+    # the required return type is 'list' - see PrefixGrowth for the implementation
+    return run_analyses(cache_files, [PrefixGrowth()], **options)[0]
 
 
 # Task 2: Routing Table Growth: AS-Path Length Evolution Over Time
-def shortest_path_by_origin_by_snapshot(cache_files):
+def shortest_path_by_origin_by_snapshot(cache_files, **options):
     """
     Compute the shortest AS path length for every origin AS from input BGP data files.
 
@@ -188,6 +3202,7 @@ def shortest_path_by_origin_by_snapshot(cache_files):
 
     Args:
         cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        options: Keyword arguments passed on to run_analyses(), such as backend, jobs, element_cache or stats
 
     Returns:
         A dictionary where every key is a string representing an AS name and every value is a list, containing one entry
@@ -199,67 +3214,29 @@ def shortest_path_by_origin_by_snapshot(cache_files):
         mean that AS 455 has a shortest path length of 4 in the first cache file, a shortest path length of 2 in the second
         cache file, and a shortest path of 3 in the third cache file. Similarly, AS 533 has shortest path lengths of 4, 10, and 2.
 
-        TODO: 
+        TODO:
         1. identify all origin ASses
         2. find all paths where an origin AS is the origin
         3. calculate path length
         4. find shortest path length
         5. filter out paths of length 1
     """
-    # the required return type is 'dict' - you are welcome to define additional data structures, if needed
-    shortest_path_by_origin_by_snapshot = {}
-    # origin_set = set()
-    for ndx, fpath in enumerate(cache_files):
-        stream = pybgpstream.BGPStream(data_interface="singlefile")
-        stream.set_data_interface_option("singlefile", "rib-file", fpath)
-
-        # keep track of min paths key: AS, value: min path len
-        min_paths = defaultdict(int)
-        # parse records
-        for record in stream.records():
-            for entry in record:
-                if 'as-path' in entry.fields and entry.fields['as-path']:
-                    ass_path = entry.fields['as-path']
-                    ass_path_arr = ass_path.split()
-
-                    # get origin 
-                    origin = ass_path_arr[-1]
-
-                    # origin_set.add(origin)
-                    # count unique AS in path
-                    unique_ass = set()
-                    for a in ass_path_arr:
-                        unique_ass.add(a)
-                    
-                    # update path length
-                    if len(unique_ass) <= 1:
-                        continue
-                    if (origin not in min_paths or len(unique_ass) < min_paths[origin]):
-                        min_paths[origin] = len(unique_ass)
-        # update the snapshot
-        for origin, length in min_paths.items():
-            if origin not in shortest_path_by_origin_by_snapshot:
-                shortest_path_by_origin_by_snapshot[origin] = [0] * len(cache_files)
-            
-            if len(shortest_path_by_origin_by_snapshot[origin]) <= ndx:
-                shortest_path_by_origin_by_snapshot[origin].extend([0] * (ndx+1-len(shortest_path_by_origin_by_snapshot[origin])))
-            shortest_path_by_origin_by_snapshot[origin][ndx] = length
-
-
-    # final update
-    for o in shortest_path_by_origin_by_snapshot:
-        if len(shortest_path_by_origin_by_snapshot[o]) < len(cache_files):
-            shortest_path_by_origin_by_snapshot[o].extend([0]* (len(cache_files) - len(shortest_path_by_origin_by_snapshot[o])))
-    return shortest_path_by_origin_by_snapshot
+    # the required return type is 'dict' - see ShortestPaths for the implementation
+    return run_analyses(cache_files, [ShortestPaths()], **options)[0]
 
 
 # Task 3: Announcement-Withdrawal Event Durations
-def aw_event_durations(cache_files):
+def aw_event_durations(cache_files, vectorized=False, max_open=None, **options):
     """
     Identify Announcement and Withdrawal events and compute the duration of all explicit AW events in the input BGP data
 
     Args:
         cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        vectorized: Compute the durations with NumPy array operations instead of a per-element state machine
+        max_open: Keep at most this many pending announcements in memory and spill the others to disk, see
+            OpenStateStore. None keeps them all in memory; the vectorized mode doesn't track them.
+        options: Keyword arguments passed on to run_analyses(), such as backend, element_cache, prefetch,
+            checkpoint or stats
 
     Returns:
         A dictionary where each key is a string representing the address of a peer (peerIP) and each value is a
@@ -268,62 +3245,15 @@ def aw_event_durations(cache_files):
 
         For example: {"127.0.0.1": {"12.13.14.0/24": [4.0, 1.0, 3.0]}}
         corresponds to the peerIP "127.0.0.1", the prefix "12.13.14.0/24" and event durations of 4.0, 1.0 and 3.0.
-        1. look for pair of last A, first W 
+        1. look for pair of last A, first W
     """
-    # the required return type is 'dict' - you are welcome to define additional data structures, if needed
-    aw_event_durations = {}
+    # the required return type is 'dict' - see AWEvents and AWEventsVectorized for the implementation
+    analysis = AWEventsVectorized() if vectorized else AWEvents(max_open=max_open)
+    return run_analyses(cache_files, [analysis], **options)[0]
 
-    last_A = defaultdict(dict) # key = Announcement, value = first withdrawl
-    for ndx, fpath in enumerate(cache_files):
-        stream = pybgpstream.BGPStream(data_interface="singlefile")
-        stream.set_data_interface_option("singlefile", "upd-file", fpath)
-
-        # implement your solution here
-        # process each record
-        for record in stream.records():
-            timestamp = record.time
-            for entry in record:
-
-                # get metadata like peer ip and prefix
-                if 'prefix' in entry.fields and entry.fields['prefix']:
-                    prefix = entry.fields['prefix']
-                    peer_ip = entry.peer_address
-
-                    if peer_ip not in last_A:
-                        last_A[peer_ip] = {}
-                    if peer_ip not in aw_event_durations:
-                        aw_event_durations[peer_ip] = {}
-                    if prefix not in aw_event_durations[peer_ip]:
-                        aw_event_durations[peer_ip][prefix] = []
-
-
-                    # map the announcement and withdrawl times
-                    if entry.type == 'A':
-                        last_A[peer_ip][prefix] = timestamp 
-                    
-                    elif entry.type == 'W':
-                        if prefix in last_A[peer_ip]:
-                            event_duration = timestamp - last_A[peer_ip][prefix]
-
-                            if event_duration > 0:
-                                aw_event_durations[peer_ip][prefix].append(event_duration)
-
-                            # withdraw announcement
-                            del last_A[peer_ip][prefix]
-    
-    # filter out the empty entries
-    for p_ip in list(aw_event_durations.keys()):
-        aw_event_durations[p_ip] = {
-            prefix:event_duration for prefix, event_duration in aw_event_durations[p_ip].items() if event_duration
-        }
-
-        if not aw_event_durations[p_ip]:
-            del aw_event_durations[p_ip]
-
-    return aw_event_durations
 
 # Task 4: RTBH Event Durations
-def rtbh_event_durations(cache_files):
+def rtbh_event_durations(cache_files, vectorized=False, max_open=None, communities=RTBH_COMMUNITIES, **options):
     """
     Identify blackholing events and compute the duration of all RTBH events from the input BGP data
 
@@ -331,6 +3261,13 @@ def rtbh_event_durations(cache_files):
 
     Args:
         cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        vectorized: Compute the durations with NumPy array operations instead of a per-element state machine
+        max_open: Keep at most this many pending announcements in memory and spill the others to disk, see
+            OpenStateStore. None keeps them all in memory; the vectorized mode doesn't track them.
+        communities: The community patterns that blackhole a prefix, see CommunityMatcher. The default matches the
+            value 666 under any ASN, e.g. ('65535:666',) only counts the RFC 7999 BLACKHOLE community.
+        options: Keyword arguments passed on to run_analyses(), such as backend, element_cache, prefetch,
+            checkpoint or stats
 
     Returns:
         A dictionary where each key is a string representing the address of a peer (peerIP) and each value is a
@@ -340,52 +3277,130 @@ def rtbh_event_durations(cache_files):
         For example: {"127.0.0.1": {"12.13.14.0/24": [4.0, 1.0, 3.0]}}
         corresponds to the peerIP "127.0.0.1", the prefix "12.13.14.0/24" and event durations of 4.0, 1.0 and 3.0.
     """
-    # the required return type is 'dict' - you are welcome to define additional data structures, if needed
-    rtbh_event_durations = defaultdict(list) # key: peer IP, value: list of RTBH event duration
-    last_A = {} # keep track of the most recent annoucement for each pair
-    for fpath in cache_files:
-        stream = pybgpstream.BGPStream(data_interface="singlefile")
-        stream.set_data_interface_option("singlefile", "upd-file", fpath)
-
-        # implement your solution here 
-        # process each record
-        for record in stream.records():
-            for entry in record:
-                # get metadata like peer ip and prefix
-                if 'prefix' in entry.fields and entry.fields['prefix']:
-                    prefix = entry.fields['prefix']
-                    peer_ip = entry.peer_address
-                    timestamp = record.time
-                    k = (peer_ip, prefix)
-
-                    # map the announcement and withdrawl times
-                    if entry.type == 'W':
-                        if k in last_A:
-                            start = last_A[k]
-                            event_duration = timestamp - start
-
-                            if event_duration > 0:
-                                rtbh_event_durations[k].append(float(event_duration))
-                            del last_A[k]
-
-                    elif entry.type == 'A':
-
-                        # check for rtbh community
-                        communities = entry.fields.get("communities", [])
-                        has_rtbh = any(c.endswith(':666') for c in communities)
-
-                        # store most recent rtbh
-                        if has_rtbh:
-                            last_A[k]=timestamp
-                        else:
-                            # remove previous rtbh announcement
-                            last_A.pop(k,None)
-    # convert back to dict
-    res = {}
-    for (peer_ip, prefix), durations in rtbh_event_durations.items():
-        if durations:
-            if peer_ip not in res:
-                res[peer_ip] = {}
-            res[peer_ip][prefix] = durations
+    # the required return type is 'dict' - see RTBHEvents and RTBHEventsVectorized for the implementation
+    analysis = (RTBHEventsVectorized(communities) if vectorized
+                else RTBHEvents(max_open=max_open, communities=communities))
+    return run_analyses(cache_files, [analysis], **options)[0]
 
-    return res
+
+def aw_event_stream(cache_files, max_open=None, **options):
+    """
+    Yield the explicit AW events of the input BGP data as (peerIP, prefix, duration) tuples as soon as they close.
+
+    events_to_durations() of the stream equals aw_event_durations(), and write_events() streams it to disk.
+
+    Args:
+        cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        max_open: See aw_event_durations()
+        options: Keyword arguments passed on to stream_events(), such as backend or element_cache
+    """
+    return stream_events(cache_files, AWEvents(max_open=max_open), **options)
+
+
+def rtbh_event_stream(cache_files, max_open=None, communities=RTBH_COMMUNITIES, **options):
+    """
+    Yield the RTBH events of the input BGP data as (peerIP, prefix, duration) tuples as soon as they close.
+
+    events_to_durations() of the stream equals rtbh_event_durations(), and write_events() streams it to disk.
+
+    Args:
+        cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        max_open: See aw_event_durations()
+        communities: See rtbh_event_durations()
+        options: Keyword arguments passed on to stream_events(), such as backend or element_cache
+    """
+    return stream_events(cache_files, RTBHEvents(max_open=max_open, communities=communities), **options)
+
+
+def rtbh_event_attribution(cache_files, rib_files, jobs=1, communities=RTBH_COMMUNITIES, **options):
+    """
+    Compute the RTBH events like rtbh_event_durations() and attribute each one to the RIB route covering its prefix
+
+    Args:
+        cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        rib_files: A chronologically sorted list of RIB files. Every event is attributed using the latest of these
+            snapshots taken before its blackholed announcement, or the first one for earlier events.
+        jobs: Number of worker processes used to index the RIB files
+        communities: See rtbh_event_durations()
+        options: Keyword arguments passed on to run_analyses(), such as backend, element_cache, checkpoint or stats.
+            Only backend and element_cache are used for the RIB files.
+
+    Returns:
+        A dictionary like the one of rtbh_event_durations(), with a dict per event instead of its duration.
+
+        For example: {"127.0.0.1": {"12.13.14.1/32": [{"duration": 4.0, "covering_prefix": "12.13.14.0/24",
+                                                      "origin_ases": ["777"]}]}}
+        where covering_prefix is the longest RIB prefix containing the blackholed prefix (possibly the prefix itself)
+        and origin_ases are its origins, or None and [] if no route covers it.
+    """
+    rib_options = {name: value for name, value in options.items() if name in ("backend", "element_cache")}
+    rib_index = run_analyses(rib_files, [RoutingTable()], jobs=jobs, **rib_options)[0]
+    return run_analyses(cache_files, [AttributedRTBHEvents(rib_index, communities)], **options)[0]
+
+
+def snapshot_deltas(cache_files, **options):
+    """
+    Represent the input RIB snapshots as deltas against the snapshot before.
+
+    Args:
+        cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        options: Keyword arguments passed on to run_analyses(), such as backend, jobs, element_cache or stats
+
+    Returns:
+        A SnapshotDeltaSeries, whose unique_prefix_counts(), top_10_by_prefix_growth() and shortest_paths() equal the
+        results of Tasks 1A, 1C and 2, and whose churn() is the time series of prefixes added and removed per origin AS
+    """
+    return run_analyses(cache_files, [SnapshotDeltas()], **options)[0]
+
+
+def merged_aw_event_durations(collector_files, vectorized=False, **options):
+    """
+    Compute the explicit AW event durations of several collectors on their chronologically merged update stream
+
+    Args:
+        collector_files: A dict {collector: chronologically sorted list of cache files}, such as
+            {"rrc04": [...], "rrc12": [...]}
+        vectorized: See aw_event_durations()
+        options: Keyword arguments passed on to run_merged_analyses(), such as backend or element_cache
+
+    Returns:
+        {collector: result of aw_event_durations() for the peers of that collector}
+    """
+    analysis = AWEventsVectorized() if vectorized else AWEvents()
+    return _split_by_collector(run_merged_analyses(collector_files, [analysis], **options)[0])
+
+
+def merged_rtbh_event_durations(collector_files, vectorized=False, communities=RTBH_COMMUNITIES, **options):
+    """
+    Compute the RTBH event durations of several collectors on their chronologically merged update stream
+
+    Args:
+        collector_files: A dict {collector: chronologically sorted list of cache files}
+        vectorized: See rtbh_event_durations()
+        communities: See rtbh_event_durations()
+        options: Keyword arguments passed on to run_merged_analyses(), such as backend or element_cache
+
+    Returns:
+        {collector: result of rtbh_event_durations() for the peers of that collector}
+    """
+    analysis = RTBHEventsVectorized(communities) if vectorized else RTBHEvents(communities=communities)
+    return _split_by_collector(run_merged_analyses(collector_files, [analysis], **options)[0])
+
+
+def churn_window(cache_files, window_minutes=15, top=10, **options):
+    """
+    Compute the update rates of the last window_minutes of the input BGP data
+
+    Args:
+        cache_files: A chronologically sorted list of absolute (also called "fully qualified") path names
+        window_minutes: Length of the sliding window
+        top: Number of flapping prefixes to report
+        options: Keyword arguments passed on to run_analyses(), such as backend, element_cache, checkpoint or stats
+
+    Returns:
+        A dictionary with the end time of the window ("window_end"), the minutes of data it covers ("window_minutes"),
+        the announcements and withdrawals per minute in total ("rates") and per peer ("peer_rates"), and the top
+        flapping prefixes with their estimated withdrawals ("top_flapping"). See ChurnWindow for the details and for
+        queries in the middle of the stream.
+    """
+    return run_analyses(cache_files, [ChurnWindow(window_minutes, top=top)], **options)[0]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import time
+from itertools import zip_longest
+from pathlib import Path
+from termcolor import colored
+
+import bgpm
+from check_solution import get_cache_files
+
+err_bullet = colored(">>>", "red")
+inf_bullet = colored(">>>", "green")
+
+RRC04 = "rrc04"
+RRC12 = "rrc12"
+
+# input directory -> kind of file
+KINDS = {
+    "rib_files": bgpm.RIB_FILE,
+    "update_files": bgpm.UPD_FILE,
+    "update_files_blackholing": bgpm.UPD_FILE,
+}
+
+
+def normalise(elem):
+    # pybgpstream returns the communities of an element as a set, the native reader as a tuple; libbgpstream only
+    # decodes standard communities, so the large ones 'global:local1:local2' of the native reader are left out
+    communities = elem[bgpm.ELEM_COMMUNITIES]
+    if communities is not None:
+        communities = sorted(community for community in communities if community.count(":") == 1)
+    return elem[:bgpm.ELEM_COMMUNITIES] + (communities,)
+
+
+def compare_file(fpath, data_type):
+    """
+    Decode one file with both backends and compare them record by record.
+
+    Returns:
+        (number of records, None) if both backends agree, or (record index, (pybgpstream record, native record)) for
+        the first record they disagree on
+    """
+    expected = bgpm.open_records(fpath, data_type, backend=bgpm.PYBGPSTREAM)
+    actual = bgpm.open_records(fpath, data_type, backend=bgpm.NATIVE)
+    records = 0
+    # a missing record (one backend stopped early) shows up as None
+    for exp, act in zip_longest(expected, actual):
+        exp = exp and (exp[0], [normalise(elem) for elem in exp[1]])
+        act = act and (act[0], [normalise(elem) for elem in act[1]])
+        if exp != act:
+            return records, (exp, act)
+        records += 1
+    return records, None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check that the native MRT reader decodes the same elements as "
+                                                 "pybgpstream")
+    parser.add_argument("--collectors", nargs="+", default=[RRC04, RRC12])
+    parser.add_argument("--kinds", nargs="+", choices=sorted(KINDS), default=sorted(KINDS))
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    BASE_DIR = Path(os.path.abspath(__file__)).parent
+    if BASE_DIR != Path(os.getcwd()):
+        os.chdir(BASE_DIR)
+
+    mismatches = 0
+    for collector in args.collectors:
+        msg = colored(f"Comparing backends on {collector}", attrs=["bold"])
+        print(f"\n{msg}")
+        for kind in args.kinds:
+            for fpath in get_cache_files(collector, kind):
+                file_id = f"{collector}[{Path(fpath).name}]"
+                begin = time.perf_counter()
+                records, difference = compare_file(fpath, KINDS[kind])
+                end = time.perf_counter()
+                if difference is None:
+                    print(f"{inf_bullet} {file_id} {records} records identical ({end - begin:.2f}s)")
+                else:
+                    mismatches += 1
+                    print(f"{err_bullet} {file_id} record {records} differs:")
+                    print(f"{err_bullet}     pybgpstream: {difference[0]}")
+                    print(f"{err_bullet}     native:      {difference[1]}")
+
+    if mismatches:
+        print(f"\n{err_bullet} {mismatches} file(s) decoded differently")
+        sys.exit(1)
+    print(f"\n{inf_bullet} both backends decoded every file identically")
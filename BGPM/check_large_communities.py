@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import socket
+import struct
+import sys
+import tempfile
+from termcolor import colored
+
+import bgpm
+import generate_workload as gw
+
+err_bullet = colored(">>>", "red")
+inf_bullet = colored(">>>", "green")
+
+PEER = "192.0.2.1"
+PEER_ASN = 64500
+LOCAL_ADDRESS = socket.inet_aton("198.19.0.1")
+PATH = (64500, 64496, 64511)
+PATTERN = "64500:*:666"
+
+# prefix -> (standard communities, large communities) of its announcement; only the first one matches PATTERN
+ROUTES = {
+    "203.0.113.0/24": (((64500, 100),), ((64500, 1, 666), (64500, 2, 100))),
+    "198.51.100.0/24": (((64500, 666),), ((64500, 1, 667),)),
+    "192.0.2.0/24": ((), ((64501, 1, 666),)),
+}
+
+
+def nlri(prefix):
+    address, length = prefix.split("/")
+    length = int(length)
+    return bytes([length]) + socket.inet_aton(address)[:(length + 7) // 8]
+
+
+def update_record(timestamp, update):
+    header = struct.pack(">IIHH", PEER_ASN, 12654, 0, 1) + socket.inet_aton(PEER) + LOCAL_ADDRESS
+    message = b"\xff" * 16 + struct.pack(">HB", 19 + len(update), 2) + update
+    return gw.mrt_record(timestamp, gw.MRT_BGP4MP, gw.BGP4MP_MESSAGE_AS4, header + message)
+
+
+def write_updates(fpath, announced_at, duration):
+    """Write an update file that announces every prefix of ROUTES and withdraws them all duration seconds later."""
+    with open(fpath, "wb") as f:
+        for prefix, (communities, large_communities) in ROUTES.items():
+            attrs = gw.path_attributes(PATH, communities, socket.inet_aton(PEER), large_communities=large_communities)
+            f.write(update_record(announced_at, struct.pack(">HH", 0, len(attrs)) + attrs + nlri(prefix)))
+        withdrawn = b"".join(nlri(prefix) for prefix in ROUTES)
+        f.write(update_record(announced_at + duration, struct.pack(">H", len(withdrawn)) + withdrawn +
+                              struct.pack(">H", 0)))
+
+
+def expected_communities(prefix):
+    communities, large_communities = ROUTES[prefix]
+    return tuple(":".join(map(str, community)) for community in communities + large_communities)
+
+
+def check_decoding(fpath):
+    # the communities of every announcement, standard ones first, as the native reader formats them
+    failures = []
+    for _, elems in bgpm.open_records(fpath, bgpm.UPD_FILE, backend=bgpm.NATIVE):
+        for elem in elems:
+            if elem[bgpm.ELEM_TYPE] != 'A':
+                continue
+            expected = expected_communities(elem[bgpm.ELEM_PREFIX])
+            if elem[bgpm.ELEM_COMMUNITIES] != expected:
+                failures.append(f"{elem[bgpm.ELEM_PREFIX]} decoded as {elem[bgpm.ELEM_COMMUNITIES]}, "
+                                f"expected {expected}")
+    return failures
+
+
+def check_matching():
+    failures = []
+    matcher = bgpm.CommunityMatcher([PATTERN])
+    for prefix in ROUTES:
+        communities = expected_communities(prefix)
+        expected = prefix == "203.0.113.0/24"
+        if matcher(communities) != expected:
+            failures.append(f"{PATTERN} {'does not match' if expected else 'matches'} {communities}")
+    # standard patterns only match standard communities
+    if bgpm.CommunityMatcher(["*:666"])(("64500:1:666",)):
+        failures.append("*:666 matches the large community 64500:1:666")
+    return failures
+
+
+def check_events(fpath, duration):
+    failures = []
+    expected = {PEER: {"203.0.113.0/24": [float(duration)]}}
+    for vectorized in (False, True):
+        actual = bgpm.rtbh_event_durations([fpath], vectorized=vectorized, communities=(PATTERN,),
+                                           backend=bgpm.NATIVE)
+        if actual != expected:
+            failures.append(f"Task 4 with vectorized={vectorized} returned {actual}, expected {expected}")
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=f"Check that the native MRT reader decodes large communities (RFC "
+                                                 f"8092) and that {PATTERN} matches a synthetic announcement")
+    parser.add_argument("--duration", type=int, default=60, help="seconds between the announcements and withdrawals")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    msg = colored("Checking large communities on a synthetic update file", attrs=["bold"])
+    print(f"\n{msg}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fpath = os.path.join(tmp_dir, f"ris.check.updates.{gw.START_TIME}.300.cache")
+        write_updates(fpath, gw.START_TIME, args.duration)
+        checks = [("decoding", lambda: check_decoding(fpath)),
+                  ("matching", check_matching),
+                  ("Task 4", lambda: check_events(fpath, args.duration))]
+        failed = 0
+        for name, check in checks:
+            failures = check()
+            if not failures:
+                print(f"{inf_bullet} {name:<9} ok")
+                continue
+            failed += 1
+            for failure in failures:
+                print(f"{err_bullet} {name:<9} {failure}")
+
+    if failed:
+        print(f"\n{err_bullet} {failed} check(s) failed")
+        sys.exit(1)
+    print(f"\n{inf_bullet} {PATTERN} matches the announcement that carries it, and only that one")
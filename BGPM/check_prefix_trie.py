@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import argparse
+import ipaddress
+import random
+import sys
+import time
+from termcolor import colored
+
+import bgpm
+
+err_bullet = colored(">>>", "red")
+inf_bullet = colored(">>>", "green")
+
+# address width -> shortest and longest prefix length that is generated
+LENGTHS = {32: (8, 32), 128: (16, 128)}
+
+
+def random_prefixes(rng, width, count, bases):
+    """
+    count random prefixes of one address family, drawn around a few base addresses so that they nest and share
+    leading bits the way routed prefixes do.
+    """
+    network = ipaddress.IPv4Network if width == 32 else ipaddress.IPv6Network
+    roots = [rng.getrandbits(width) for _ in range(bases)]
+    shortest, longest = LENGTHS[width]
+    prefixes = []
+    for _ in range(count):
+        # flip a few low bits of a base address, then cut it to a random length
+        address = rng.choice(roots) ^ rng.getrandbits(rng.randint(0, width - shortest))
+        length = rng.randint(shortest, longest)
+        prefixes.append(network((address, length), strict=False))
+    return prefixes
+
+
+def brute_force(stored, query):
+    """The expected get(), lookup() and more_specifics() of query, by scanning every stored prefix."""
+    covering = [net for net in stored if net.version == query.version and query.subnet_of(net)]
+    best = max(covering, key=lambda net: net.prefixlen, default=None)
+    inside = sorted((net for net in stored if net.version == query.version and net != query and net.subnet_of(query)),
+                    key=lambda net: (int(net.network_address), net.prefixlen))
+    return (stored.get(query),
+            None if best is None else (best, stored[best]),
+            [(net, stored[net]) for net in inside])
+
+
+def trie_answers(trie, query):
+    # the trie's answers, with the prefixes it returns parsed for the comparison
+    prefix = str(query)
+    lookup = trie.lookup(prefix)
+    return (trie.get(prefix),
+            None if lookup is None else (ipaddress.ip_network(lookup[0]), lookup[1]),
+            [(ipaddress.ip_network(net), value) for net, value in trie.more_specifics(prefix)])
+
+
+def check_round(rng, prefixes, queries, bases):
+    """
+    Insert random prefixes into a fresh PrefixTrie, some of them twice, and compare every query against a brute force
+    scan.
+
+    Returns:
+        A list of (query, expected, actual) for the queries the trie answered differently
+    """
+    trie = bgpm.PrefixTrie()
+    stored = {}
+    candidates = []
+    for width in LENGTHS:
+        nets = random_prefixes(rng, width, prefixes, bases)
+        candidates.extend(nets)
+        for ndx, net in enumerate(nets):
+            trie.insert(str(net), ndx)
+            stored[net] = ndx
+
+    mismatches = []
+    if len(trie) != len(stored):
+        mismatches.append(("len()", len(stored), len(trie)))
+    # stored prefixes and prefixes around them that may or may not be stored
+    for width in LENGTHS:
+        candidates.extend(random_prefixes(rng, width, queries, bases))
+    for query in rng.sample(candidates, min(len(candidates), 2 * queries)):
+        expected = brute_force(stored, query)
+        actual = trie_answers(trie, query)
+        if expected != actual:
+            mismatches.append((str(query), expected, actual))
+    return mismatches
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check the longest prefix match, exact match and more specific "
+                                                 "queries of PrefixTrie against a brute force scan of random IPv4 and "
+                                                 "IPv6 prefixes")
+    parser.add_argument("--rounds", type=int, default=20, help="number of tries built from scratch")
+    parser.add_argument("--prefixes", type=int, default=500, help="prefixes inserted per address family and round")
+    parser.add_argument("--queries", type=int, default=500, help="queries per round")
+    parser.add_argument("--bases", type=int, default=8, help="base addresses the prefixes of a round are drawn around")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    msg = colored("Comparing PrefixTrie against a brute force scan", attrs=["bold"])
+    print(f"\n{msg}")
+    failed = 0
+    for round_ndx in range(args.rounds):
+        round_id = f"round[{round_ndx:>3}]"
+        begin = time.perf_counter()
+        mismatches = check_round(rng, args.prefixes, args.queries, args.bases)
+        end = time.perf_counter()
+        if not mismatches:
+            print(f"{inf_bullet} {round_id} {2 * args.prefixes} prefixes, {2 * args.queries} queries identical "
+                  f"({end - begin:.2f}s)")
+            continue
+        failed += 1
+        query, expected, actual = mismatches[0]
+        print(f"{err_bullet} {round_id} {len(mismatches)} queries differ, the first is {query}:")
+        print(f"{err_bullet}     brute force: {expected}")
+        print(f"{err_bullet}     PrefixTrie:  {actual}")
+
+    if failed:
+        print(f"\n{err_bullet} {failed} round(s) answered differently")
+        sys.exit(1)
+    print(f"\n{inf_bullet} PrefixTrie answered every query like the brute force scan")
@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 
+import ast
+import hashlib
+import inspect
 import os
 import sys
 import traceback
 import json
 import pickle
 import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 from termcolor import colored
 
@@ -21,9 +26,24 @@ TASK_2 = "task_2"
 TASK_3 = "task_3"
 TASK_4 = "task_4"
 
+# decoded elements are cached here so that later runs don't have to decode the MRT files again
+ELEMENT_CACHE = ".element_cache"
+
+# set to True to print the per-task decode/analysis breakdown (the instrumentation adds a little overhead)
+COLLECT_STREAM_STATS = False
+
+# the (collector, task) pairs run concurrently in this many worker processes - None means one per CPU
+JOBS = None
+
+# task results are memoized here, keyed by the contents of the input files and the bgpm.py code the task depends on,
+# so only the tasks affected by an edit are run again - set to None to always run every task
+RESULT_CACHE = ".result_cache"
+
 runtimes = {
     "summary": {RRC04: 0, RRC12: 0}, 
-    "details": {RRC04: {TASK_1A: 0, TASK_1B: 0, TASK_1C: 0, TASK_2: 0, TASK_3: 0, TASK_4: 0}, RRC12: {TASK_1A: 0, TASK_1B: 0, TASK_1C: 0, TASK_2: 0, TASK_3: 0, TASK_4: 0}}
+    "details": {RRC04: {TASK_1A: 0, TASK_1B: 0, TASK_1C: 0, TASK_2: 0, TASK_3: 0, TASK_4: 0}, RRC12: {TASK_1A: 0, TASK_1B: 0, TASK_1C: 0, TASK_2: 0, TASK_3: 0, TASK_4: 0}},
+    # tasks served from the result cache, with the runtime of the run that computed them
+    "cached": {RRC04: {}, RRC12: {}}
 }
 
 # pickle files are a standard way of serializing data in Python
@@ -48,6 +68,91 @@ def write_json(data, fpath, sort_keys=False, indent=4):
         print(f"{err_prologue} {task} (json): {repr(e)}\n")
 
 
+def _top_level_definitions(module):
+    # name -> source of the top-level statements that define it, including the ones nested in try and if blocks
+    source = inspect.getsource(module)
+    definitions = {}
+
+    def visit(statements):
+        for stmt in statements:
+            if isinstance(stmt, (ast.Try, ast.If)):
+                visit(stmt.body + stmt.orelse + getattr(stmt, "finalbody", []) +
+                      [line for handler in getattr(stmt, "handlers", []) for line in handler.body])
+                continue
+            if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                names = [stmt.name]
+            elif isinstance(stmt, (ast.Import, ast.ImportFrom)):
+                names = [(alias.asname or alias.name).split(".")[0] for alias in stmt.names]
+            elif isinstance(stmt, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+                targets = stmt.targets if isinstance(stmt, ast.Assign) else [stmt.target]
+                names = [node.id for target in targets for node in ast.walk(target) if isinstance(node, ast.Name)]
+            else:
+                continue
+            for name in names:
+                definitions.setdefault(name, []).append(stmt)
+
+    visit(ast.parse(source).body)
+    return source, definitions
+
+
+def source_fingerprint(func):
+    """
+    Hash the source of a task function and of every top-level definition of its module that it reaches, directly or
+    through other definitions. Editing code that a task doesn't use leaves its fingerprint unchanged.
+    """
+    source, definitions = _top_level_definitions(sys.modules[func.__module__])
+    digest = hashlib.sha256()
+    seen = set()
+    pending = [func.__name__]
+    while pending:
+        name = pending.pop()
+        if name in seen or name not in definitions:
+            continue
+        seen.add(name)
+        for stmt in definitions[name]:
+            digest.update(ast.get_source_segment(source, stmt).encode())
+            pending.extend(node.id for node in ast.walk(stmt) if isinstance(node, ast.Name))
+    return digest.hexdigest()
+
+
+def result_key(func, cache_files):
+    """Content address of a task result: the task's code and the names and contents of its input files."""
+    digest = hashlib.sha256(f"{func.__module__}.{func.__name__}:{source_fingerprint(func)}".encode())
+    for fpath in cache_files:
+        digest.update(Path(fpath).name.encode())
+        with open(fpath, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_cached_result(key):
+    try:
+        with open(Path(RESULT_CACHE, f"{key}.p"), "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def save_cached_result(key, entry):
+    from bgpm import _atomic_write
+    _atomic_write(str(Path(RESULT_CACHE, f"{key}.p")), partial(pickle.dump, entry))
+
+
+def run_task(func, cache_files):
+    # runs in a worker process - returns (result, runtime in seconds, stream stats summary or None)
+    from bgpm import RunStats
+    stats = RunStats() if COLLECT_STREAM_STATS else None
+    begin = time.perf_counter()
+    res = func(cache_files, element_cache=ELEMENT_CACHE, stats=stats)
+    end = time.perf_counter()
+    return res, end - begin, None if stats is None else stats.summary()
+
+
+def get_cache_files(data_set, kind):
+    return sorted([str(p) for p in Path(data_set, kind).glob("*.cache")])
+
+
 def load_reference_solution(collector, task):
     solution_file = Path(collector, f"reference_solution/{task}.p")
     try:
@@ -63,9 +168,6 @@ if __name__ == "__main__":
         # print(f"{BASE_DIR} != {os.getcwd()} - changing")
         os.chdir(BASE_DIR)
 
-    def get_cache_files(data_set, kind):
-        return sorted([str(p) for p in Path(data_set, kind).glob("*.cache")])
-
     try:
         # import all the functions and exit with error if any fail
         try:
@@ -90,6 +192,26 @@ if __name__ == "__main__":
         ]
 
         collectors = [RRC04, RRC12]
+        stream_stats = {collector: {} for collector in collectors}
+
+        # look every (collector, task) pair up in the result cache and run the others concurrently; the results are
+        # checked below in the usual order as they become available
+        executor = ProcessPoolExecutor(max_workers=JOBS)
+        scheduled = {}
+        wall_begin = time.perf_counter()
+        for collector in collectors:
+            for task, func, arg in tasks:
+                cache_files = get_cache_files(collector, arg)
+                key = entry = None
+                if RESULT_CACHE is not None:
+                    try:
+                        key = result_key(func, cache_files)
+                        entry = load_cached_result(key)
+                    except Exception as e:
+                        print(f"{err_bullet} {collector}[{task:<7}] result cache disabled: {repr(e)}")
+                        key = None
+                future = None if entry is not None else executor.submit(run_task, func, cache_files)
+                scheduled[collector, task] = (key, entry, future)
 
         for collector in collectors:
             msg = colored(f"Processing {collector}", attrs=["bold"])
@@ -100,11 +222,20 @@ if __name__ == "__main__":
                 err_prologue = f"{err_bullet} {task_id}"
 
                 try:
-                    # run the task and capture timing information
-                    begin = time.perf_counter()
-                    res = func(get_cache_files(collector, arg))
-                    end = time.perf_counter()
-                    runtimes["details"][collector][task] = (end - begin)
+                    # collect the result and its timing information
+                    key, entry, future = scheduled[collector, task]
+                    if entry is not None:
+                        res, seconds, summary = entry
+                        runtimes["cached"][collector][task] = seconds
+                        print(f"{inf_prologue} cache hit (computed in {seconds:.2f}s by an earlier run)")
+                    else:
+                        res, seconds, summary = future.result()
+                        runtimes["details"][collector][task] = seconds
+                        print(f"{inf_prologue} computed in {seconds:.2f}s")
+                        if key is not None:
+                            save_cached_result(key, (res, seconds, summary))
+                    if summary is not None:
+                        stream_stats[collector][task] = summary
                     if not res:
                         # res is empty, so nothing needs to be cached to disk - student skipped this task
                         print(f"{err_prologue} nothing returned for this task")
@@ -159,6 +290,9 @@ if __name__ == "__main__":
                     print(f"{err_prologue} {repr(e)}\n")
                     traceback.print_exc()
 
+        executor.shutdown()
+        wall_seconds = time.perf_counter() - wall_begin
+
         # record timing summaries
         for collector in collectors:
             runtimes["summary"][collector] = sum(runtimes["details"][collector].values())
@@ -170,6 +304,13 @@ if __name__ == "__main__":
         print(json.dumps(runtimes["summary"], indent=4))
         print("\nTiming Details:")
         print(json.dumps(runtimes["details"], indent=4))
+        print("\nCached Tasks:")
+        print(json.dumps(runtimes["cached"], indent=4))
+        print(f"\nWall Clock: {wall_seconds:.2f}s")
+
+        if COLLECT_STREAM_STATS:
+            print("\nStream Details:")
+            print(json.dumps(stream_stats, indent=4))
 
     except Exception as e:
         # something bad happened, so print it to real stderr
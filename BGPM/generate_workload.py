@@ -0,0 +1,581 @@
+#!/usr/bin/env python3
+
+import argparse
+import bisect
+import bz2
+import gzip
+import json
+import os
+import pickle
+import random
+import socket
+import struct
+import sys
+import time
+from array import array
+from collections import defaultdict, deque
+from pathlib import Path
+from termcolor import colored
+
+"""
+Synthetic MRT workload generator.
+
+Writes a data set with the same layout as the bundled collectors - rib_files, update_files,
+update_files_blackholing and reference_solution - so that benchmark.py (and anything else that globs *.cache files
+the way check_solution.py does) can run every task on it. The reference solution is computed by the generator from
+its own model, independently of bgpm.py, so it is the ground truth for the generated files.
+
+At --scale 1 the volumes follow rrc12: about 300k prefixes and 33k ASes in the first of 8 RIB dumps growing to
+about 660k prefixes, and 110k BGP messages from 140 peers in every 5-minute update file. Prefixes, origins and
+messages grow linearly with the scale factor; peers, transit ASes and the number of files don't.
+
+The model:
+- Every prefix has one origin AS. Every RIB peer carries a prefix with probability --visibility, and one "home" peer
+  always carries it, so a prefix never disappears once it has been announced.
+- Each RIB dump adds --prefix-growth new prefixes: at most one for any existing origin, one each for
+  --origin-growth new origins, and a planted number for a dozen fast-growing origins. Because existing origins gain
+  at most one prefix per dump, the planted origins are the only candidates for the Task 1C top 10 and have distinct
+  growth rates, so the answer has no ties.
+- AS paths are the peer AS, transit ASes drawn from --transit-ases, and the origin AS, with the number of ASes drawn
+  from --path-lengths and the origin prepended with probability --prepend-ratio. Between dumps every path changes
+  with probability --churn.
+- Every update message announces or withdraws a batch of prefixes (--batch-sizes) for one peer. Withdrawals mostly
+  hit prefixes the peer announced recently, and announcements in update_files_blackholing carry the 65535:666
+  blackhole community with probability --blackhole-ratio.
+"""
+
+err_bullet = colored(">>>", "red")
+inf_bullet = colored(">>>", "green")
+
+RIB_FILES = "rib_files"
+UPDATE_FILES = "update_files"
+BLACKHOLING_FILES = "update_files_blackholing"
+REFERENCE_SOLUTION = "reference_solution"
+
+# defaults at --scale 1, chosen to match rrc12
+DEFAULT_PATH_LENGTHS = "2:1.5,3:17,4:38,5:22,6:8,7:4,8:3.5,9:1.4,10:0.5,11:0.2"
+DEFAULT_BATCH_SIZES = "1:68,2:11,3:6,4:4,5:3,6:2.5,8:2,12:1.5,16:1,32:1"
+
+# fast-growing origins planted for Task 1C - two more than the top 10, so that the top 10 is a real selection
+PLANTED_ORIGINS = 12
+BLACKHOLE_COMMUNITY = (65535, 666)
+
+MASK64 = (1 << 64) - 1
+START_TIME = 1609459200  # 2021-01-01T00:00:00Z
+UPDATE_INTERVAL = 300
+
+MRT_HEADER = struct.Struct(">IHHI")
+MRT_TABLE_DUMP_V2 = 13
+MRT_BGP4MP = 16
+TD2_PEER_INDEX_TABLE = 1
+TD2_RIB_IPV4_UNICAST = 2
+TD2_RIB_IPV6_UNICAST = 4
+BGP4MP_STATE_CHANGE_AS4 = 5
+BGP4MP_MESSAGE_AS4 = 4
+
+ATTR_ORIGIN = 1
+ATTR_AS_PATH = 2
+ATTR_NEXT_HOP = 3
+ATTR_COMMUNITIES = 8
+ATTR_MP_REACH_NLRI = 14
+ATTR_MP_UNREACH_NLRI = 15
+ATTR_LARGE_COMMUNITY = 32
+AS_SEQUENCE = 2
+
+# the IPv4 prefixes are taken from 1.0.0.0-223.255.255.255, first all /24s, then all /23s and so on in the order of
+# IPV4_LENGTHS, so that the /24s alone serve up to about --scale 25; the IPv6 ones are /48s in 2a00::/12
+IPV4_FIRST = 1 << 24
+IPV4_END = 224 << 24
+IPV4_LENGTHS = (24, 23, 22, 21, 20, 19, 18, 17, 16, 25, 26, 27, 28)
+# index of the first IPv4 prefix of every length in IPV4_LENGTHS, and the total as the last item
+IPV4_STARTS = [sum((IPV4_END - IPV4_FIRST) >> (32 - length) for length in IPV4_LENGTHS[:i])
+               for i in range(len(IPV4_LENGTHS) + 1)]
+IPV4_CAPACITY = IPV4_STARTS[-1]
+IPV6_BASE = 0x2a00 << 112
+
+# salts that keep the hashed decisions of the RIB model independent of each other
+VISIBILITY, HOME_PEER, CHURN, PATH = range(4)
+
+
+def parse_weights(text):
+    """Parse a "value:weight,value:weight" distribution into parallel lists of values and cumulative weights."""
+    values, cumulative = [], []
+    total = 0.0
+    for item in text.split(","):
+        value, weight = item.split(":")
+        total += float(weight)
+        values.append(int(value))
+        cumulative.append(total)
+    return values, [w / total for w in cumulative]
+
+
+def mix(*values):
+    """A 64-bit hash of a tuple of integers (splitmix64 finalizer), used for decisions that must be repeatable."""
+    h = 0
+    for value in values:
+        h = (h ^ value) * 0x9E3779B97F4A7C15 & MASK64
+        h = (h ^ (h >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+        h = (h ^ (h >> 27)) * 0x94D049BB133111EB & MASK64
+        h ^= h >> 31
+    return h
+
+
+def asn(ndx):
+    """Map an AS index to an AS number, skipping AS_TRANS and the private ranges and using 4-byte ASNs above 64000."""
+    number = ndx + 1
+    if number >= 23456:
+        number += 1
+    if number >= 64000:
+        number += 131072 - 64000
+    return number
+
+
+class Workload:
+    """The prefixes, origins, peers and AS paths of a generated data set."""
+
+    def __init__(self, args):
+        self.args = args
+        self.seed = args.seed
+        self.path_lengths = parse_weights(args.path_lengths)
+        self.batch_sizes = parse_weights(args.batch_sizes)
+
+        # transit ASes take the first AS indices, origins the ones after them, so a peer is never an origin
+        self.n_transit = args.transit_ases
+        self.peers = [socket.inet_aton(f"198.18.{i >> 8}.{i & 255}") for i in range(max(args.rib_peers,
+                                                                                          args.update_peers))]
+        self.peer_asns = [asn(mix(self.seed, i) % self.n_transit) for i in range(len(self.peers))]
+
+        self.plan_prefixes()
+
+    def plan_prefixes(self):
+        """Assign an origin to every prefix of every RIB dump; dump s has the prefixes 0 .. self.sizes[s] - 1."""
+        args = self.args
+        rng = random.Random(self.seed)
+        n_prefixes = max(PLANTED_ORIGINS, round(args.prefixes * args.scale))
+        n_origins = max(PLANTED_ORIGINS + 1, round(args.origins * args.scale))
+
+        # planted origin i gains i + 2 prefixes per dump: growth (i + 2) * (n_dumps - 1), which no other origin reaches
+        planted = list(range(PLANTED_ORIGINS))
+        natural = n_origins - PLANTED_ORIGINS
+
+        # the first dump: one prefix for every origin, the rest skewed towards the low origin indices; the per prefix
+        # tables are arrays, which keeps them to a few bytes per prefix at large scales
+        origins = array("I", planted)
+        origins.extend(range(PLANTED_ORIGINS, n_origins))
+        origins.extend(PLANTED_ORIGINS + int(natural * rng.random() ** 3) for _ in range(n_prefixes - len(origins)))
+        rng.shuffle(origins)
+        self.sizes = [len(origins)]
+
+        for _ in range(1, args.rib_files):
+            new_origins = round(n_origins * args.origin_growth)
+            new_prefixes = round(self.sizes[-1] * args.prefix_growth)
+            block = [i for i in planted for _ in range(i + 2)]
+            block += range(n_origins, n_origins + new_origins)
+            existing = min(max(0, new_prefixes - len(block)), n_origins - PLANTED_ORIGINS)
+            block += rng.sample(range(PLANTED_ORIGINS, n_origins), existing)
+            rng.shuffle(block)
+            origins.extend(block)
+            n_origins += new_origins
+            self.sizes.append(len(origins))
+
+        self.origins = origins
+        self.ipv6 = bytearray(mix(self.seed, ndx) / 2**64 < args.ipv6_ratio for ndx in range(len(origins)))
+        n_ipv4 = len(origins) - sum(self.ipv6)
+        if n_ipv4 > IPV4_CAPACITY:
+            raise ValueError(f"{n_ipv4} IPv4 prefixes don't fit in 1.0.0.0-223.255.255.255, lower --scale or raise "
+                             f"--ipv6-ratio")
+
+        # prefix index -> index of the prefix within its address family
+        self.family_ndx = array("I")
+        counts = [0, 0]
+        for is_ipv6 in self.ipv6:
+            self.family_ndx.append(counts[is_ipv6])
+            counts[is_ipv6] += 1
+
+    def origin_asn(self, ndx):
+        return asn(self.n_transit + self.origins[ndx])
+
+    def prefix(self, ndx):
+        """Return (prefix string, NLRI encoding, is IPv6) of a prefix index."""
+        family_ndx = self.family_ndx[ndx]
+        if self.ipv6[ndx]:
+            raw = (IPV6_BASE + (family_ndx << 80)).to_bytes(16, "big")
+            return f"{socket.inet_ntop(socket.AF_INET6, raw)}/48", b"\x30" + raw[:6], True
+        block = bisect.bisect_right(IPV4_STARTS, family_ndx) - 1
+        length = IPV4_LENGTHS[block]
+        raw = (IPV4_FIRST + ((family_ndx - IPV4_STARTS[block]) << (32 - length))).to_bytes(4, "big")
+        return f"{socket.inet_ntoa(raw)}/{length}", bytes([length]) + raw[:(length + 7) // 8], False
+
+    def as_path(self, peer, origin_asn, h):
+        """Return the AS path of a route as a list of AS numbers, drawn from the 64-bit hash h."""
+        values, cumulative = self.path_lengths
+        length = values[bisect.bisect_left(cumulative, (h & 0xFFFFFFFF) / 2**32)]
+        path = [self.peer_asns[peer]]
+        for _ in range(length - 2):
+            h = mix(h)
+            path.append(asn(h % self.n_transit))
+        path.append(origin_asn)
+        if (h >> 32) / 2**32 < self.args.prepend_ratio:
+            path += [origin_asn] * (1 + (h >> 60) % 3)
+        return path
+
+    def batch_size(self, rng):
+        values, cumulative = self.batch_sizes
+        return values[bisect.bisect_left(cumulative, rng.random())]
+
+
+def path_attributes(path, communities, peer_address, ipv6_nlri=b"", large_communities=()):
+    """
+    Encode the ORIGIN, AS_PATH, NEXT_HOP/MP_REACH_NLRI, COMMUNITIES and LARGE_COMMUNITY attributes of a route.
+
+    ipv6_nlri is the NLRI of the MP_REACH_NLRI attribute of an IPv6 update; RIB entries of IPv6 prefixes pass None to
+    get the abbreviated attribute of RFC 6396 that only holds the next hop.
+    """
+    segments = b""
+    for start in range(0, len(path), 255):
+        chunk = path[start:start + 255]
+        segments += struct.pack(f">BB{len(chunk)}I", AS_SEQUENCE, len(chunk), *chunk)
+    attrs = struct.pack(">BBBB", 0x40, ATTR_ORIGIN, 1, 0) + struct.pack(">BBH", 0x50, ATTR_AS_PATH, len(segments))
+    attrs += segments
+
+    next_hop = b"\0" * 10 + b"\xff\xff" + peer_address
+    if ipv6_nlri is None:
+        value = bytes([16]) + next_hop
+        attrs += struct.pack(">BBH", 0x90, ATTR_MP_REACH_NLRI, len(value)) + value
+    elif ipv6_nlri:
+        value = struct.pack(">HBB", 2, 1, 16) + next_hop + b"\0" + ipv6_nlri
+        attrs += struct.pack(">BBH", 0x90, ATTR_MP_REACH_NLRI, len(value)) + value
+    else:
+        attrs += struct.pack(">BBB", 0x40, ATTR_NEXT_HOP, 4) + peer_address
+
+    if communities:
+        value = b"".join(struct.pack(">HH", *community) for community in communities)
+        attrs += struct.pack(">BBH", 0xD0, ATTR_COMMUNITIES, len(value)) + value
+    if large_communities:
+        value = b"".join(struct.pack(">III", *community) for community in large_communities)
+        attrs += struct.pack(">BBH", 0xD0, ATTR_LARGE_COMMUNITY, len(value)) + value
+    return attrs
+
+
+def open_output(fpath, compress):
+    if compress == "gzip":
+        return gzip.open(fpath, "wb", compresslevel=1)
+    if compress == "bzip2":
+        return bz2.open(fpath, "wb", compresslevel=1)
+    return open(fpath, "wb")
+
+
+def mrt_record(timestamp, mrt_type, subtype, body):
+    return MRT_HEADER.pack(timestamp, mrt_type, subtype, len(body)) + body
+
+
+def write_rib_files(workload, out_dir, compress):
+    """
+    Write the RIB dumps and return the ground truth of Tasks 1A, 1B, 1C and 2.
+    """
+    args = workload.args
+    seed = workload.seed
+    n_peers = args.rib_peers
+    peers = workload.peers[:n_peers]
+    visibility = int(args.visibility * 2**64)
+    churn = int(args.churn * 2**64)
+
+    peer_table = struct.pack(">IHH", 0, 0, n_peers)
+    for peer, peer_address in enumerate(peers):
+        peer_table += struct.pack(">BI", 0x02, 0) + peer_address + struct.pack(">I", workload.peer_asns[peer])
+
+    # the path version of every RIB entry, i.e. the last dump in which its path changed, in the order the entries are
+    # written; visibility doesn't change between dumps, so every dump writes the entries of the previous one first
+    versions = array("H")
+    unique_prefixes, unique_ases, first, last, shortest = [], [], {}, {}, {}
+    for snapshot, n_prefixes in enumerate(workload.sizes):
+        timestamp = START_TIME + snapshot * args.rib_interval
+        entry = 0
+        ases = set()
+        prefix_counts = defaultdict(int)
+        min_paths = {}
+
+        fpath = Path(out_dir, RIB_FILES, f"bview.{timestamp}.cache")
+        with open_output(fpath, compress) as f:
+            f.write(mrt_record(timestamp, MRT_TABLE_DUMP_V2, TD2_PEER_INDEX_TABLE, peer_table))
+            for ndx in range(n_prefixes):
+                _, nlri, is_ipv6 = workload.prefix(ndx)
+                origin_asn = workload.origin_asn(ndx)
+                home = mix(seed, HOME_PEER, ndx) % n_peers
+                entries = []
+                for peer in range(n_peers):
+                    if peer != home and mix(seed, VISIBILITY, ndx, peer) >= visibility:
+                        continue
+                    # the path changes in the dumps where the churn hash fires, including the ones before the prefix
+                    # was first announced
+                    if entry < len(versions):
+                        if mix(seed, CHURN, ndx, peer, snapshot) < churn:
+                            versions[entry] = snapshot
+                    else:
+                        versions.append(next((s for s in range(snapshot, 0, -1)
+                                              if mix(seed, CHURN, ndx, peer, s) < churn), 0))
+                    version = versions[entry]
+                    entry += 1
+                    path = workload.as_path(peer, origin_asn, mix(seed, PATH, ndx, peer, version))
+                    attrs = path_attributes(path, (), peers[peer], None if is_ipv6 else b"")
+                    entries.append(struct.pack(">HIH", peer, timestamp, len(attrs)) + attrs)
+
+                    ases.update(path)
+                    length = len(set(path))
+                    if length > 1 and length < min_paths.get(origin_asn, sys.maxsize):
+                        min_paths[origin_asn] = length
+
+                prefix_counts[origin_asn] += 1
+                body = struct.pack(">I", ndx) + nlri + struct.pack(">H", len(entries)) + b"".join(entries)
+                subtype = TD2_RIB_IPV6_UNICAST if is_ipv6 else TD2_RIB_IPV4_UNICAST
+                f.write(mrt_record(timestamp, MRT_TABLE_DUMP_V2, subtype, body))
+
+        unique_prefixes.append(n_prefixes)
+        unique_ases.append(len(ases))
+        for origin_asn, count in prefix_counts.items():
+            if origin_asn in first:
+                last[origin_asn] = count
+            else:
+                first[origin_asn] = count
+        for origin_asn, length in min_paths.items():
+            shortest.setdefault(str(origin_asn), [0] * len(workload.sizes))[snapshot] = length
+        print(f"{inf_bullet} {fpath}: {n_prefixes} prefixes, {len(ases)} ASes")
+
+    growth = sorted(((c_2 - first[origin_asn]) / first[origin_asn], origin_asn) for origin_asn, c_2 in last.items())
+    top = growth[-10:]
+    if len(growth) > 10 and growth[-11][0] == top[0][0]:
+        raise ValueError("the Task 1C top 10 has a tie - this is a bug in the generator")
+    top_10 = [str(origin_asn) for _, origin_asn in top]
+    return {"task_1a": unique_prefixes, "task_1b": unique_ases, "task_1c": top_10, "task_2": shortest}
+
+
+class EventTruth:
+    """Replays the generated elements through the Task 3 and Task 4 definitions."""
+
+    def __init__(self):
+        self.last_announcement = {}
+        self.last_blackhole = {}
+        self.aw = defaultdict(lambda: defaultdict(list))
+        self.rtbh = defaultdict(lambda: defaultdict(list))
+
+    def announce(self, timestamp, peer, prefix, blackhole):
+        k = (peer, prefix)
+        self.last_announcement[k] = timestamp
+        if blackhole:
+            self.last_blackhole[k] = timestamp
+        else:
+            self.last_blackhole.pop(k, None)
+
+    def withdraw(self, timestamp, peer, prefix):
+        k = (peer, prefix)
+        for last, durations in ((self.last_announcement, self.aw), (self.last_blackhole, self.rtbh)):
+            if k in last:
+                duration = timestamp - last.pop(k)
+                if duration > 0:
+                    durations[peer][prefix].append(float(duration))
+
+    @staticmethod
+    def result(durations):
+        return {peer: dict(by_prefix) for peer, by_prefix in durations.items()}
+
+
+def write_update_files(workload, out_dir, kind, n_files, blackhole_ratio, compress):
+    """Write one stream of update files and return its EventTruth."""
+    args = workload.args
+    rng = random.Random(f"{workload.seed}-{kind}")
+    n_messages = max(1, round(args.messages * args.scale))
+    n_peers = args.update_peers
+    peer_names = [socket.inet_ntoa(address) for address in workload.peers]
+
+    # the prefixes of the first RIB dump that updates are drawn from, split by address family so that a batch never
+    # mixes IPv4 and IPv6
+    pool_size = min(workload.sizes[0], max(1, round(args.update_prefixes * args.scale)))
+    pools = ([], [])
+    for ndx in rng.sample(range(workload.sizes[0]), pool_size):
+        pools[workload.ipv6[ndx]].append(ndx)
+    pools = [pool for pool in pools if pool]
+    prefixes = {}
+    # peer -> pool -> the prefixes the peer announced most recently
+    recent = [[deque(maxlen=64) for _ in pools] for _ in range(n_peers)]
+    truth = EventTruth()
+
+    local_address = socket.inet_aton("198.19.0.1")
+    for file_ndx in range(n_files):
+        start = START_TIME + file_ndx * UPDATE_INTERVAL
+        fpath = Path(out_dir, kind, f"ris.{args.name}.updates.{start}.{UPDATE_INTERVAL}.cache")
+        times = sorted(start + rng.randrange(UPDATE_INTERVAL) for _ in range(n_messages))
+        with open_output(fpath, compress) as f:
+            for timestamp in times:
+                peer = rng.randrange(n_peers)
+                peer_address = workload.peers[peer]
+                header = struct.pack(">IIHH", workload.peer_asns[peer], 12654, 0, 1) + peer_address + local_address
+                roll = rng.random()
+
+                if roll < args.state_change_ratio:
+                    body = header + struct.pack(">HH", 6, 1)
+                    f.write(mrt_record(timestamp, MRT_BGP4MP, BGP4MP_STATE_CHANGE_AS4, body))
+                    continue
+
+                size = workload.batch_size(rng)
+                pool = rng.randrange(len(pools))
+                announced = recent[peer][pool]
+                if roll < args.state_change_ratio + args.withdraw_ratio and announced and rng.random() < 0.9:
+                    # withdraw prefixes the peer announced recently, which are the ones that close events
+                    batch = {announced.pop() for _ in range(min(size, len(announced)))}
+                else:
+                    batch = set(rng.sample(pools[pool], min(size, len(pools[pool]))))
+                for ndx in batch:
+                    if ndx not in prefixes:
+                        prefixes[ndx] = workload.prefix(ndx)
+                is_ipv6 = workload.ipv6[next(iter(batch))]
+                nlri = b"".join(prefixes[ndx][1] for ndx in batch)
+                peer_name = peer_names[peer]
+
+                if roll < args.state_change_ratio + args.withdraw_ratio:
+                    if is_ipv6:
+                        value = struct.pack(">HB", 2, 1) + nlri
+                        attrs = struct.pack(">BBH", 0x90, ATTR_MP_UNREACH_NLRI, len(value)) + value
+                        update = struct.pack(">HH", 0, len(attrs)) + attrs
+                    else:
+                        update = struct.pack(">H", len(nlri)) + nlri + struct.pack(">H", 0)
+                    for ndx in batch:
+                        truth.withdraw(timestamp, peer_name, prefixes[ndx][0])
+                else:
+                    first = next(iter(batch))
+                    h = rng.getrandbits(64)
+                    path = workload.as_path(peer, workload.origin_asn(first), h)
+                    blackhole = rng.random() < blackhole_ratio
+                    communities = [(workload.peer_asns[peer] & 0xFFFF, value)
+                                   for value in range(100, 100 + (h >> 40) % 3)]
+                    if blackhole:
+                        communities.append(BLACKHOLE_COMMUNITY)
+                    if is_ipv6:
+                        attrs = path_attributes(path, communities, peer_address, nlri)
+                        update = struct.pack(">HH", 0, len(attrs)) + attrs
+                    else:
+                        attrs = path_attributes(path, communities, peer_address)
+                        update = struct.pack(">HH", 0, len(attrs)) + attrs + nlri
+                    for ndx in batch:
+                        truth.announce(timestamp, peer_name, prefixes[ndx][0], blackhole)
+                        announced.append(ndx)
+
+                message = b"\xff" * 16 + struct.pack(">HB", 19 + len(update), 2) + update
+                f.write(mrt_record(timestamp, MRT_BGP4MP, BGP4MP_MESSAGE_AS4, header + message))
+    print(f"{inf_bullet} {Path(out_dir, kind)}: {n_files} files of {n_messages} messages")
+    return truth
+
+
+def verify(out_dir, ground_truth, backend):
+    """Run the bgpm.py tasks on the generated files and compare them to the ground truth."""
+    import bgpm
+
+    tasks = [
+        ("task_1a", bgpm.unique_prefixes_by_snapshot, RIB_FILES),
+        ("task_1b", bgpm.unique_ases_by_snapshot, RIB_FILES),
+        ("task_1c", bgpm.top_10_ases_by_prefix_growth, RIB_FILES),
+        ("task_2", bgpm.shortest_path_by_origin_by_snapshot, RIB_FILES),
+        ("task_3", bgpm.aw_event_durations, UPDATE_FILES),
+        ("task_4", bgpm.rtbh_event_durations, BLACKHOLING_FILES),
+    ]
+    failures = 0
+    for task, func, kind in tasks:
+        cache_files = sorted([str(p) for p in Path(out_dir, kind).glob("*.cache")])
+        begin = time.perf_counter()
+        res = func(cache_files, backend=backend)
+        end = time.perf_counter()
+        if res == ground_truth[task]:
+            print(f"{inf_bullet} {task:<7} matches the ground truth ({end - begin:.2f}s)")
+        else:
+            failures += 1
+            print(f"{err_bullet} {task:<7} differs from the ground truth")
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic MRT data set with known task answers")
+    parser.add_argument("--output", default="synthetic", help="directory of the data set")
+    parser.add_argument("--name", default="synthetic", help="collector name used in the update file names")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="volume relative to rrc12 - prefixes, origins and messages grow linearly with it")
+    parser.add_argument("--seed", type=int, default=6250)
+    parser.add_argument("--compress", choices=["gzip", "bzip2", "none"], default="gzip")
+
+    group = parser.add_argument_group("RIB dumps")
+    group.add_argument("--rib-files", type=int, default=8)
+    group.add_argument("--rib-interval", type=int, default=1200, help="seconds between RIB dumps")
+    group.add_argument("--rib-peers", type=int, default=8, help="peers in the RIB dumps")
+    group.add_argument("--visibility", type=float, default=0.7, help="probability that a peer carries a prefix")
+    group.add_argument("--prefixes", type=int, default=300000, help="prefixes in the first RIB dump at scale 1")
+    group.add_argument("--prefix-growth", type=float, default=0.12, help="new prefixes per dump, relative")
+    group.add_argument("--origins", type=int, default=30000, help="origin ASes in the first RIB dump at scale 1")
+    group.add_argument("--origin-growth", type=float, default=0.08, help="new origin ASes per dump, relative")
+    group.add_argument("--churn", type=float, default=0.1, help="probability that a path changes between dumps")
+    group.add_argument("--ipv6-ratio", type=float, default=0.15, help="fraction of IPv6 prefixes")
+
+    group = parser.add_argument_group("AS paths")
+    group.add_argument("--path-lengths", default=DEFAULT_PATH_LENGTHS,
+                       help="distribution of the number of ASes in a path, as length:weight pairs")
+    group.add_argument("--transit-ases", type=int, default=3000, help="size of the pool of peer and transit ASes")
+    group.add_argument("--prepend-ratio", type=float, default=0.05, help="probability that the origin is prepended")
+
+    group = parser.add_argument_group("update files")
+    group.add_argument("--update-files", type=int, default=25)
+    group.add_argument("--blackholing-files", type=int, default=49)
+    group.add_argument("--update-peers", type=int, default=140)
+    group.add_argument("--update-prefixes", type=int, default=7000, help="prefixes that see updates at scale 1")
+    group.add_argument("--messages", type=int, default=110000, help="messages per update file at scale 1")
+    group.add_argument("--batch-sizes", default=DEFAULT_BATCH_SIZES,
+                       help="distribution of the prefixes per message, as size:weight pairs")
+    group.add_argument("--withdraw-ratio", type=float, default=0.04, help="fraction of withdrawal messages")
+    group.add_argument("--blackhole-ratio", type=float, default=0.06,
+                       help="fraction of announcements tagged 65535:666 in update_files_blackholing")
+    group.add_argument("--state-change-ratio", type=float, default=0.0005,
+                       help="fraction of peer state change records")
+
+    parser.add_argument("--verify", action="store_true", help="check the bgpm.py tasks against the ground truth")
+    parser.add_argument("--backend", default="native", help="bgpm.py backend used by --verify")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    BASE_DIR = Path(os.path.abspath(__file__)).parent
+    if BASE_DIR != Path(os.getcwd()):
+        os.chdir(BASE_DIR)
+
+    out_dir = Path(args.output)
+    stale = [p for kind in [RIB_FILES, UPDATE_FILES, BLACKHOLING_FILES] for p in Path(out_dir, kind).glob("*.cache")]
+    if stale and not Path(out_dir, "workload.json").exists():
+        # never delete a data set this script didn't write, such as one of the real collectors
+        print(f"{err_bullet} {out_dir} holds .cache files that weren't generated - choose another --output")
+        sys.exit(1)
+    for fpath in stale:
+        fpath.unlink()
+    for kind in [RIB_FILES, UPDATE_FILES, BLACKHOLING_FILES, REFERENCE_SOLUTION]:
+        os.makedirs(Path(out_dir, kind), exist_ok=True)
+
+    msg = colored(f"Generating {out_dir} at scale {args.scale}", attrs=["bold"])
+    print(f"\n{msg}")
+    begin = time.perf_counter()
+    workload = Workload(args)
+    ground_truth = write_rib_files(workload, out_dir, args.compress)
+    ground_truth["task_3"] = EventTruth.result(
+        write_update_files(workload, out_dir, UPDATE_FILES, args.update_files, 0.0, args.compress).aw)
+    ground_truth["task_4"] = EventTruth.result(
+        write_update_files(workload, out_dir, BLACKHOLING_FILES, args.blackholing_files, args.blackhole_ratio,
+                           args.compress).rtbh)
+
+    for task, solution in ground_truth.items():
+        with open(Path(out_dir, REFERENCE_SOLUTION, f"{task}.p"), "wb") as f:
+            pickle.dump(solution, f)
+    with open(Path(out_dir, "workload.json"), "w") as f:
+        json.dump({"parameters": vars(args), "seconds": time.perf_counter() - begin}, f, indent=4)
+        f.write("\n")
+    print(f"{inf_bullet} ground truth written to {Path(out_dir, REFERENCE_SOLUTION)}")
+
+    if args.verify:
+        msg = colored("Verifying bgpm.py against the ground truth", attrs=["bold"])
+        print(f"\n{msg}")
+        if verify(out_dir, ground_truth, args.backend):
+            sys.exit(1)